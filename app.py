@@ -1,22 +1,79 @@
 import streamlit as st
-from PIL import Image
+import requests
 import time
-import re
-from datetime import datetime, timedelta
-from storage import load_inventory, save_inventory
-from llm_utils import ask_llm, safe_json_parse
-from ocr_utils import preprocess_image, extract_text_multiconfig, parse_expiry_date
+from datetime import datetime
+from storage import load_inventory, upsert_item, delete_item
+from llm_utils import stream_llm, warm_up
+from ocr_utils import OCRError, limit_tesseract_threads, load_image
+from pipeline import WARMUP_SYSTEM_PROMPTS
+from ocr_prefetch import OCRPrefetcher, upload_digest
+from ingest_client import IngestError, get_ingest_client
+from frame_selection import VIDEO_EXTENSIONS, file_frames, select_frames
+from barcode_catalogue import get_barcode_catalogue
+from product_classifier import get_classifier
+from shelf_life import SHELF_LIFE_SYSTEM, estimate_expiry
+from planner import PLANNING_HORIZON_DAYS, plan_inventory
+from inventory_model import Inventory
+from inventory_view import ALL_CATEGORIES, SORT_OPTIONS, get_view, page_count
+from metrics import get_registry
+
+limit_tesseract_threads()
 
 st.set_page_config(page_title="Smart Expiry Tracker", page_icon="🧾", layout="wide")
 
+@st.cache_resource
+def start_llm_warm_up():
+    # Once per server process: load llama3 in the background while the user
+    # is still picking images.
+    return warm_up(WARMUP_SYSTEM_PROMPTS + (SHELF_LIFE_SYSTEM,))
+
+start_llm_warm_up()
+
+@st.cache_resource
+def get_ocr_prefetcher():
+    # Shared by all sessions: uploads are read in the background while the
+    # user is still on the page.
+    return OCRPrefetcher()
+
+# With INGEST_SERVICE_URL set, extraction and shelf-life estimates run in
+# ingest_service and this script only uploads and displays.
+ingest_client = get_ingest_client()
+
 st.title("Smart Expiry Tracker")
 st.markdown("*LLM-powered grocery inventory management*")
 
-if "products" not in st.session_state:
-    st.session_state["products"] = load_inventory()
+# The session's only copy of the inventory; the expiry index and the
+# plain-dict form used by the planner are derived from it.
+if "inventory" not in st.session_state:
+    st.session_state["inventory"] = Inventory.from_dict(load_inventory())
+if "inventory_version" not in st.session_state:
+    st.session_state["inventory_version"] = 0
 if 'temp_product' not in st.session_state:
     st.session_state.temp_product = None
 
+def save_product(name, details):
+    st.session_state["inventory"].set(name, details)
+    st.session_state["inventory_version"] += 1
+    return upsert_item(name, details)
+
+def remove_product(name):
+    st.session_state["inventory"].remove(name)
+    st.session_state["inventory_version"] += 1
+    return delete_item(name)
+
+def select_capture(uploads, key):
+    # Sharpest frames of a burst or video upload. Scoring a clip takes a
+    # moment, so the selection is kept until the uploaded files change.
+    signature = tuple((upload.name, upload.size) for upload in uploads)
+    cached = st.session_state.get(key)
+    if cached is None or cached[0] != signature:
+        candidates, seen = select_frames(file_frames(uploads))
+        cached = st.session_state[key] = (signature, [image for image, _ in candidates], seen)
+    return cached[1], cached[2]
+
+MAX_REMOVAL_SUGGESTIONS = 10
+CAPTURE_TYPES = ["jpg", "png", "jpeg"] + [ext.lstrip(".") for ext in VIDEO_EXTENSIONS]
+
 menu = ["Add Product", "View Inventory", "Usage Planner"]
 choice = st.radio("Navigation", menu, horizontal=True)
 
@@ -32,31 +89,79 @@ if choice == "Add Product":
     is_fresh_produce = (product_type == "Fresh Produce (manual entry)")
     
     if not is_fresh_produce:
+        capture_mode = st.radio(
+            "Capture:",
+            ["Single photo", "Burst / video"],
+            horizontal=True,
+            help="Upload several shots or a short clip of each label; the sharpest frames are read."
+        )
+        is_burst = (capture_mode == "Burst / video")
+        
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("Product Label")
-            uploaded_file1 = st.file_uploader(
-                "Upload product front label", 
-                type=["jpg", "png", "jpeg"],
-                key="product_img"
-            )
-            if uploaded_file1:
-                img1 = Image.open(uploaded_file1)
-                st.image(img1, caption=f"Original: {uploaded_file1.name}", use_column_width=True)
+            if is_burst:
+                uploaded_file1 = st.file_uploader(
+                    "Upload product label photos or video",
+                    type=CAPTURE_TYPES,
+                    accept_multiple_files=True,
+                    key="product_burst"
+                )
+                if uploaded_file1:
+                    candidates1, seen1 = select_capture(uploaded_file1, "product_frames")
+                    digest1 = upload_digest(uploaded_file1)
+                    if candidates1:
+                        st.image(candidates1[0], caption=f"Sharpest of {seen1} frames", use_column_width=True)
+                    else:
+                        st.warning("No frames could be read from the upload")
+            else:
+                uploaded_file1 = st.file_uploader(
+                    "Upload product front label", 
+                    type=["jpg", "png", "jpeg"],
+                    key="product_img"
+                )
+                if uploaded_file1:
+                    candidates1 = [load_image(uploaded_file1)]
+                    digest1 = upload_digest(uploaded_file1)
+                    st.image(uploaded_file1.getvalue(), caption=f"Original: {uploaded_file1.name}", use_column_width=True)
         
         with col2:
             st.subheader("Expiry Label")
-            uploaded_file2 = st.file_uploader(
-                "Upload expiry date label", 
-                type=["jpg", "png", "jpeg"],
-                key="expiry_img"
-            )
-            if uploaded_file2:
-                img2 = Image.open(uploaded_file2)
-                st.image(img2, caption=f"Original: {uploaded_file2.name}", use_column_width=True)
-
-        if uploaded_file1 and uploaded_file2:
+            if is_burst:
+                uploaded_file2 = st.file_uploader(
+                    "Upload expiry label photos or video",
+                    type=CAPTURE_TYPES,
+                    accept_multiple_files=True,
+                    key="expiry_burst"
+                )
+                if uploaded_file2:
+                    candidates2, seen2 = select_capture(uploaded_file2, "expiry_frames")
+                    digest2 = upload_digest(uploaded_file2)
+                    if candidates2:
+                        st.image(candidates2[0], caption=f"Sharpest of {seen2} frames", use_column_width=True)
+                    else:
+                        st.warning("No frames could be read from the upload")
+            else:
+                uploaded_file2 = st.file_uploader(
+                    "Upload expiry date label", 
+                    type=["jpg", "png", "jpeg"],
+                    key="expiry_img"
+                )
+                if uploaded_file2:
+                    candidates2 = [load_image(uploaded_file2)]
+                    digest2 = upload_digest(uploaded_file2)
+                    st.image(uploaded_file2.getvalue(), caption=f"Original: {uploaded_file2.name}", use_column_width=True)
+
+        # Start reading each label as soon as it is uploaded; the button
+        # then only waits for whatever is still running, plus the LLM.
+        prefetcher = get_ocr_prefetcher() if ingest_client is None else None
+        if prefetcher and uploaded_file1 and candidates1:
+            prefetcher.submit(digest1, "product", candidates1)
+        if prefetcher and uploaded_file2 and candidates2:
+            prefetcher.submit(digest2, "expiry", candidates2)
+        
+        if uploaded_file1 and uploaded_file2 and candidates1 and candidates2:
             
             if st.button("Process Images", type="primary", use_container_width=True):
                 
@@ -64,108 +169,31 @@ if choice == "Add Product":
                 
                 with st.spinner("Processing..."):
                     
-                    proc_img1 = preprocess_image(img1, mode="product")
-                    proc_img2 = preprocess_image(img2, mode="expiry")
-                    
-                    text1 = extract_text_multiconfig(proc_img1)
-                    text2 = extract_text_multiconfig(proc_img2)
-                    
-                    product_prompt = f"""IMPORTANT: This is a NEW product analysis. Forget any previous products.
-
-I will show you OCR text from a product label. The text may be in GERMAN or English.
-
-OCR Text from Product Label:
-'''
-{text1}
-'''
-
-CRITICAL: If you see German words, translate them:
-- REIS = Rice
-- BASMATI-REIS or BASMATI REIS = Basmati Rice
-- KAFFEE = Coffee
-- MILCH = Milk
-- ZUCKER = Sugar
-
-Product Type Keywords:
-- Rice: RICE, REIS, BASMATI, JASMINE, BASMATI-REIS
-- Coffee: COFFEE, KAFFEE, ESPRESSO
-- Tea: TEA, TEE, CHAI
-- Spice: MASALA, CURRY, GEWÜRZ
-- Dairy: MILK, MILCH, YOGURT, KÄSE
-
-Task:
-1. Look at the OCR text - do you see "BASMATI" or "REIS"?
-2. If YES → name="Basmati Reis", category="Rice/Grains"
-3. Find quantity like "1kg", "500g", "1 kg", "500 g"
-
-Examples:
-- OCR has "aromatischer BASMATI-REIS 1kg" → name="Basmati Reis", category="Rice/Grains", quantity="1kg"
-- OCR has "MACCOFFEE 100g" → name="MacCoffee", category="Coffee", quantity="100g"
-
-Return ONLY JSON:
-{{
-  "name": "product name",
-  "category": "category",
-  "quantity": "amount or Unknown"
-}}
-
-JSON:"""
-
-                    product_response = ask_llm(product_prompt)
-                    product_data = safe_json_parse(product_response)
-                    
-                    name = product_data.get("name", "Unknown Product")
-                    category = product_data.get("category", "Unknown Category")
-                    quantity = product_data.get("quantity", "Unknown")
-                    
-                    expiry_date = parse_expiry_date(text2)
-                    
-                    if not expiry_date:
-                        expiry_prompt = f"""Extract expiry date from OCR text.
-
-OCR Text:
-{text2}
-
-Patterns to look for:
-- 02.2027 → February 2027
-- EXP: OCT-2025 → October 2025
-- MHD: 05.2026 → May 2026
-- DEC 2027 → December 2027
-
-IMPORTANT: If only month and year are given (e.g., "OCT 2025"), use the LAST day of that month.
-
-Examples:
-- OCT 2025 → 2025-10-31 (October has 31 days)
-- FEB 2026 → 2026-02-28 (February has 28 days in non-leap year)
-- APR 2027 → 2027-04-30 (April has 30 days)
-
-Return ONLY valid JSON:
-{{
-  "expiry": "DD-MM-YYYY"
-}}
-
-JSON:"""
-                        expiry_response = ask_llm(expiry_prompt)
-                        expiry_data = safe_json_parse(expiry_response)
-                        raw_expiry = expiry_data.get("expiry", "Unknown")
-                        
-                        if raw_expiry and raw_expiry != "Unknown":
-                            try:
-                                exp_dt = datetime.strptime(raw_expiry, "%d-%m-%Y")
-                                if exp_dt.day == 1:
-                                    year = exp_dt.year
-                                    month = exp_dt.month
-                                    from calendar import monthrange
-                                    last_day = monthrange(year, month)[1]
-                                    expiry_date = f"{last_day:02d}-{month:02d}-{year}"
-                                else:
-                                    expiry_date = raw_expiry
-                            except:
-                                expiry_date = raw_expiry
-                        else:
-                            expiry_date = "Unknown"
+                    if ingest_client is not None:
+                        try:
+                            details = ingest_client.wait(ingest_client.submit_pair(
+                                candidates1, candidates2, save=False, job_id=f"app-{digest1}-{digest2}"
+                            ))
+                        except (IngestError, requests.RequestException) as e:
+                            st.error(f"Ingest service failed: {e}")
+                            st.stop()
+                    else:
+                        try:
+                            details = prefetcher.process(digest1, candidates1, digest2, candidates2)
+                        except OCRError as e:
+                            st.error(f"OCR failed: {e}")
+                            st.stop()
+                    barcode = details["barcode"]
+                    name = details["name"]
+                    category = details["category"]
+                    quantity = details["quantity"]
+                    expiry_date = details["expiry"]
                     
                     st.success("Extraction Complete")
+                    if details["source"] == "barcode":
+                        st.caption(f"Product recognised from barcode {barcode}, no OCR or LLM call needed")
+                    elif details["source"] == "local":
+                        st.caption("Product recognised locally, no LLM call needed")
                     
                     st.markdown("### Extracted Information")
                     result_col1, result_col2, result_col3, result_col4 = st.columns(4)
@@ -183,7 +211,8 @@ JSON:"""
                         'name': name,
                         'category': category,
                         'quantity': quantity,
-                        'expiry': expiry_date if expiry_date else "Unknown"
+                        'expiry': expiry_date if expiry_date else "Unknown",
+                        'barcode': barcode
                     }
         
         if st.session_state.get('temp_product'):
@@ -237,14 +266,20 @@ JSON:"""
             with save_col1:
                 if st.button("Save to Inventory", type="primary", use_container_width=True):
                     if edited_name and edited_name.strip():
-                        st.session_state["products"][edited_name] = {
+                        details = {
                             "category": edited_category,
                             "quantity": edited_quantity,
                             "expiry": edited_expiry,
                             "added_date": datetime.now().strftime("%d-%m-%Y")
                         }
                         
-                        if save_inventory(st.session_state["products"]):
+                        get_classifier().learn(edited_name, edited_category)
+                        if product_data.get('barcode'):
+                            get_barcode_catalogue().remember(
+                                product_data['barcode'], edited_name, edited_category, edited_quantity
+                            )
+                        
+                        if save_product(edited_name, details):
                             st.success(f"{edited_name} added to inventory")
                         else:
                             st.warning(f"{edited_name} added but save failed")
@@ -279,52 +314,31 @@ JSON:"""
             if produce_name and produce_name.strip():
                 with st.spinner("Estimating shelf life..."):
                     
-                    expiry_prompt = f"""Estimate the typical shelf life for this fresh produce item when stored properly.
-
-Product: {produce_name}
-Category: {produce_category}
-Quantity: {produce_quantity}
-
-Provide a CONSERVATIVE estimate (minimum days before spoiling when refrigerated if needed).
-
-Common guidelines:
-- Leafy Greens: 3-5 days
-- Root Vegetables (onions, potatoes, carrots): 7-21 days  
-- Tomatoes: 5-7 days
-- Fruits (apples, oranges): 5-10 days
-- Berries: 3-5 days
-- Herbs: 5-7 days
-
-Today is {datetime.now().strftime('%Y-%m-%d')}.
-
-Return ONLY valid JSON:
-{{
-  "days": number,
-  "expiry": "DD-MM-YYYY",
-  "storage_tip": "brief storage advice"
-}}
-
-JSON:"""
-                    
-                    expiry_response = ask_llm(expiry_prompt)
-                    expiry_data = safe_json_parse(expiry_response)
-                    
-                    estimated_days = expiry_data.get("days", 7)
-                    expiry_date = expiry_data.get("expiry", 
-                        (datetime.now() + timedelta(days=estimated_days)).strftime('%d-%m-%Y'))
-                    storage_tip = expiry_data.get("storage_tip", "Store in cool, dry place")
+                    if ingest_client is not None:
+                        try:
+                            estimate = ingest_client.wait(ingest_client.submit_produce(
+                                produce_name, produce_category, produce_quantity, save=False
+                            ))
+                        except (IngestError, requests.RequestException) as e:
+                            st.error(f"Ingest service failed: {e}")
+                            st.stop()
+                    else:
+                        estimate = estimate_expiry(produce_name, produce_category, produce_quantity)
+                    estimated_days = estimate["days"]
+                    expiry_date = estimate["expiry"]
+                    storage_tip = estimate["storage_tip"]
                     
                     st.success(f"Estimated shelf life: {estimated_days} days")
                     st.info(f"{storage_tip}")
                     
-                    st.session_state["products"][produce_name] = {
+                    details = {
                         "category": "Fresh Produce",
                         "quantity": f"{produce_quantity} units",
                         "expiry": expiry_date,
                         "added_date": datetime.now().strftime("%d-%m-%Y")
                     }
                     
-                    if save_inventory(st.session_state["products"]):
+                    if save_product(produce_name, details):
                         st.success(f"{produce_name} (qty: {produce_quantity}) added")
                     else:
                         st.warning(f"{produce_name} added but save failed")
@@ -337,106 +351,84 @@ JSON:"""
 elif choice == "View Inventory":
     st.header("Current Inventory")
     
-    if st.session_state["products"]:
+    if st.session_state["inventory"]:
         
-        expired_items = []
-        for product_name, details in st.session_state["products"].items():
-            expiry = details.get("expiry", "Unknown")
-            if expiry and expiry != "Unknown":
-                try:
-                    expiry_date = datetime.strptime(expiry, "%d-%m-%Y")
-                    days_left = (expiry_date - datetime.now()).days
-                    if days_left < 0:
-                        expired_items.append((product_name, abs(days_left)))
-                except:
-                    pass
+        now = datetime.now()
+        expiry_index = st.session_state["inventory"].index
+        expired_items = expiry_index.expired(now)
         
         if expired_items:
             st.warning("Smart Removal Suggestions")
-            for product_name, days_expired in expired_items:
+            for product_name, days_expired in expired_items[:MAX_REMOVAL_SUGGESTIONS]:
                 col1, col2 = st.columns([3, 1])
                 with col1:
                     st.write(f"'{product_name}' expired {days_expired} days ago. Should I remove it?")
                 with col2:
                     if st.button("Remove", key=f"remove_expired_{product_name}"):
-                        del st.session_state["products"][product_name]
-                        save_inventory(st.session_state["products"])
+                        remove_product(product_name)
                         st.rerun()
+            if len(expired_items) > MAX_REMOVAL_SUGGESTIONS:
+                if st.button(f"Remove all {len(expired_items)} expired items", key="remove_all_expired"):
+                    for product_name, _ in expired_items:
+                        remove_product(product_name)
+                    st.rerun()
             st.markdown("---")
         
-        for idx, (product_name, details) in enumerate(st.session_state["products"].items()):
-            
-            expiry = details.get("expiry", "Unknown")
-            quantity = details.get("quantity", "Unknown")
-            days_left = "Unknown"
-            urgency_color = "🔵"
-            
-            is_depleted = False
-            if quantity != "Unknown":
-                try:
-                    qty_match = re.search(r'(\d+\.?\d*)', quantity)
-                    if qty_match:
-                        qty_value = float(qty_match.group(1))
-                        if qty_value <= 0:
-                            is_depleted = True
-                            urgency_color = "🔴"
-                except:
-                    pass
-            
-            if expiry and expiry != "Unknown" and not is_depleted:
-                try:
-                    expiry_date = datetime.strptime(expiry, "%d-%m-%Y")
-                    days_left = (expiry_date - datetime.now()).days
-                    
-                    if days_left < 0:
-                        urgency_color = "🔴"
-                        days_left = f"EXPIRED ({abs(days_left)} days ago)"
-                    elif days_left < 3:
-                        urgency_color = "🔴"
-                        days_left = f"{days_left} days"
-                    elif days_left < 7:
-                        urgency_color = "🟠"
-                        days_left = f"{days_left} days"
-                    elif days_left < 30:
-                        urgency_color = "🟡"
-                        days_left = f"{days_left} days"
-                    else:
-                        urgency_color = "🟢"
-                        days_left = f"{days_left} days"
-                except:
-                    pass
-            
+        view = get_view(st.session_state, st.session_state["inventory"],
+                        st.session_state["inventory_version"], now)
+
+        filter_col1, filter_col2, filter_col3, filter_col4 = st.columns([2, 2, 2, 1])
+        with filter_col1:
+            search = st.text_input("Search", key="inventory_search")
+        with filter_col2:
+            category = st.selectbox("Category", [ALL_CATEGORIES] + view.categories, key="inventory_category")
+        with filter_col3:
+            sort = st.selectbox("Sort by", SORT_OPTIONS, key="inventory_sort")
+        with filter_col4:
+            page_size = st.selectbox("Per page", [10, 25, 50, 100], index=1, key="inventory_page_size")
+
+        pages = page_count(len(view.filter(category, search, sort)), page_size)
+        if st.session_state.get("inventory_page", 1) > pages:
+            st.session_state["inventory_page"] = pages
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages,
+                               key="inventory_page") if pages > 1 else 1
+        rows, total = view.query(category, search, sort, page, page_size)
+        totals = view.totals(category, search, sort)
+        st.caption(f"Showing {len(rows)} of {total} items"
+                   + (f" | In stock: {', '.join(totals)}" if totals else ""))
+
+        for row in rows:
+            product_name = row["name"]
+
             with st.container():
                 col1, col2, col3 = st.columns([3, 2, 2])
                 
                 with col1:
-                    st.markdown(f"### {urgency_color} {product_name}")
-                    st.caption(f"Category: {details['category']} | Qty: {quantity}")
+                    st.markdown(f"### {row['badge']} {product_name}")
+                    st.caption(f"Category: {row['category']} | Qty: {row['quantity']}")
                     
-                    if is_depleted:
+                    if row["depleted"]:
                         st.error("OUT OF STOCK")
                 
                 with col2:
-                    st.metric("Expiry", expiry if expiry else "Unknown")
+                    st.metric("Expiry", row["expiry"])
                 
                 with col3:
-                    st.metric("Days Left", days_left)
+                    st.metric("Days Left", row["days_label"])
                 
-                if is_depleted:
+                if row["depleted"]:
                     st.warning("This item is out of stock. Would you like to remove it?")
                     col_deplete1, col_deplete2 = st.columns([1, 3])
                     with col_deplete1:
-                        if st.button("Yes, Remove", key=f"deplete_remove_{idx}"):
-                            del st.session_state["products"][product_name]
-                            save_inventory(st.session_state["products"])
+                        if st.button("Yes, Remove", key=f"deplete_remove_{product_name}"):
+                            remove_product(product_name)
                             st.rerun()
                     with col_deplete2:
-                        if st.button("No, Keep It", key=f"deplete_keep_{idx}"):
+                        if st.button("No, Keep It", key=f"deplete_keep_{product_name}"):
                             st.rerun()
                 
-                if st.button("🗑️ Delete", key=f"del_{idx}"):
-                    del st.session_state["products"][product_name]
-                    save_inventory(st.session_state["products"])
+                if st.button("🗑️ Delete", key=f"del_{product_name}"):
+                    remove_product(product_name)
                     st.rerun()
                 
                 st.markdown("---")
@@ -446,7 +438,7 @@ elif choice == "View Inventory":
 elif choice == "Usage Planner":
     st.header("Usage Planner")
     
-    if st.session_state["products"]:
+    if st.session_state["inventory"]:
         
         st.subheader("Your Cooking Setup")
         pref_col1, pref_col2 = st.columns(2)
@@ -463,32 +455,59 @@ elif choice == "Usage Planner":
                 index=1
             )
         
+        equipment = []
+        if has_stovetop:
+            equipment.append("stovetop")
+        if has_oven:
+            equipment.append("oven")
+        if has_microwave:
+            equipment.append("microwave")
+        equipment_str = ", ".join(equipment) if equipment else "only basic tools"
+        
         st.markdown("---")
         
-        selected_product = st.selectbox(
-            "Select Product:", 
-            list(st.session_state["products"].keys())
-        )
+        plan_mode = st.radio("Plan for:", ["Single product", "Whole inventory"], horizontal=True)
         
-        if st.button("Generate Usage Plan", type="primary"):
-            
-            details = st.session_state["products"][selected_product]
-            
-            other_products = [p for p in st.session_state["products"].keys() if p != selected_product]
-            inventory_list = ", ".join(other_products) if other_products else "No other products"
+        if plan_mode == "Whole inventory":
+            st.caption(f"Items expiring within {PLANNING_HORIZON_DAYS} days are ranked by urgency and planned together")
             
-            equipment = []
-            if has_stovetop:
-                equipment.append("stovetop")
-            if has_oven:
-                equipment.append("oven")
-            if has_microwave:
-                equipment.append("microwave")
-            equipment_str = ", ".join(equipment) if equipment else "only basic tools"
+            if st.button("Generate Inventory Plan", type="primary"):
+                with st.spinner("Creating plan..."):
+                    plans = plan_inventory(st.session_state["inventory"].to_dict(), equipment_str, cooking_skill)
+                
+                if not plans:
+                    st.info("Nothing expires soon, no plan needed")
+                
+                for product_name, days_left, meals in plans:
+                    st.markdown(f"### {product_name} ({days_left} days left)")
+                    if not meals:
+                        st.caption("No plan returned for this item")
+                    for meal in meals:
+                        st.markdown(f"**{meal.get('date', '')}**: {meal.get('meal', '')}")
+                        combine_with = meal.get("combine_with")
+                        if combine_with:
+                            if isinstance(combine_with, list):
+                                combine_with = ", ".join(str(item) for item in combine_with)
+                            st.markdown(f"- Combine with: {combine_with}")
+                        if meal.get("method"):
+                            st.markdown(f"- Method: {meal['method']}")
+        
+        else:
+            selected_product = st.selectbox(
+                "Select Product:", 
+                st.session_state["inventory"].names()
+            )
             
-            with st.spinner("Creating plan..."):
+            if st.button("Generate Usage Plan", type="primary"):
+                
+                details = st.session_state["inventory"].get(selected_product).to_dict()
                 
-                experts_prompt = f"""You are simulating THREE different expert perspectives to create the best usage plan.
+                other_products = [p for p in st.session_state["inventory"].names() if p != selected_product]
+                inventory_list = ", ".join(other_products) if other_products else "No other products"
+                
+                with st.spinner("Creating plan..."):
+                    
+                    experts_prompt = f"""You are simulating THREE different expert perspectives to create the best usage plan.
 
 Product: {selected_product}
 Category: {details['category']}
@@ -520,16 +539,52 @@ Format:
 
 Your plan:"""
 
-                plan = ask_llm(experts_prompt)
-                
-                st.markdown(f"### Usage Plan for {selected_product}")
-                st.markdown(plan)
-                
-                if st.button("Generate Different Plan", use_container_width=True):
-                    st.rerun()
+                    st.markdown(f"### Usage Plan for {selected_product}")
+                    plan_placeholder = st.empty()
+
+                    plan = ""
+                    for token in stream_llm(experts_prompt):
+                        plan += token
+                        plan_placeholder.markdown(plan)
+                    
+                    if st.button("Generate Different Plan", use_container_width=True):
+                        st.rerun()
     else:
         st.warning("No products to plan for")
         st.info("Go to 'Add Product' to add items")
 
 st.markdown("---")
-st.caption("Tip: Make sure Ollama is running with llama3 model")
\ No newline at end of file
+st.caption("Tip: Make sure Ollama is running with llama3 model")
+
+if st.sidebar.checkbox("Show latency metrics"):
+    registry = get_registry()
+    st.sidebar.subheader("Latency by stage")
+    summary = registry.summary()
+    if summary:
+        st.sidebar.dataframe(
+            [{key: round(value, 4) if isinstance(value, float) else value for key, value in row.items()}
+             for row in summary],
+            use_container_width=True
+        )
+    else:
+        st.sidebar.info("No spans recorded yet")
+
+    classifier_stats = get_classifier().stats()
+    if classifier_stats["local_hits"] + classifier_stats["llm_fallbacks"]:
+        st.sidebar.caption(
+            f"Products resolved locally: {classifier_stats['hit_rate']:.0%} "
+            f"({classifier_stats['local_hits']} local, {classifier_stats['llm_fallbacks']} via LLM)"
+        )
+
+    with st.sidebar.expander("Recent spans"):
+        for entry in reversed(registry.recent_spans()[-30:]):
+            labels = ", ".join(f"{key}={value}" for key, value in entry["labels"].items())
+            st.text(f"{entry['span']:<26} {entry['seconds'] * 1000:9.1f} ms  {labels}")
+
+    st.sidebar.download_button("Prometheus metrics", registry.export_prometheus(),
+                               file_name="metrics.prom", mime="text/plain")
+    st.sidebar.download_button("JSON metrics", registry.export_json(),
+                               file_name="metrics.json", mime="application/json")
+    if st.sidebar.button("Reset metrics"):
+        registry.reset()
+        st.rerun()
\ No newline at end of file
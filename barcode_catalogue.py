@@ -0,0 +1,162 @@
+import json
+import os
+import tempfile
+import threading
+import cv2
+import numpy as np
+
+CATALOGUE_FILE = os.path.join(".cache", "barcodes.json")
+# EAN/UPC symbologies as reported by OpenCV; other codes are ignored.
+RETAIL_TYPES = ("EAN_13", "EAN_8", "UPC_A", "UPC_E")
+
+_detector = None
+_detector_lock = threading.Lock()
+_catalogue = None
+_catalogue_lock = threading.Lock()
+
+
+def _get_detector():
+    # None when this OpenCV build has no barcode module (it is part of the
+    # main package from 4.8, of opencv-contrib before that).
+    global _detector
+    with _detector_lock:
+        if _detector is None and hasattr(cv2, "barcode"):
+            _detector = cv2.barcode.BarcodeDetector()
+        return _detector
+
+def check_digit_valid(code):
+    if not code.isdigit() or len(code) not in (8, 12, 13):
+        return False
+    digits = [int(c) for c in code]
+    # Weights 3,1,3,... from the digit left of the check digit.
+    total = sum(d * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits[:-1])))
+    return (10 - total % 10) % 10 == digits[-1]
+
+def normalize_code(code):
+    # UPC-A is EAN-13 with a leading zero; store one form for both.
+    code = code.strip()
+    if len(code) == 12:
+        code = "0" + code
+    return code
+
+def expand_upce(code):
+    # UPC-E (number system, six digits, check digit) -> the UPC-A code it
+    # abbreviates. The check digit belongs to the UPC-A form, so UPC-E is
+    # validated after expansion. None when code is not UPC-E shaped.
+    if len(code) != 8 or not code.isdigit() or code[0] not in "01":
+        return None
+    system, digits, check = code[0], code[1:7], code[7]
+    last = digits[5]
+    if last in "012":
+        body = digits[0:2] + last + "0000" + digits[2:5]
+    elif last == "3":
+        body = digits[0:3] + "00000" + digits[3:5]
+    elif last == "4":
+        body = digits[0:4] + "00000" + digits[4]
+    else:
+        body = digits[0:5] + "0000" + last
+    return system + body + check
+
+def canonical_code(code, kind=None):
+    # The normalised form of a decoded code, or None when it is not a valid
+    # EAN/UPC. kind is OpenCV's symbology name when known; an 8-digit code
+    # of unknown kind is read as EAN-8, and as UPC-E if that fails.
+    code = code.strip()
+    if kind == "UPC_E" or (kind is None and len(code) == 8 and not check_digit_valid(code)):
+        code = expand_upce(code) or code
+    if not check_digit_valid(code):
+        return None
+    return normalize_code(code)
+
+def decode_barcodes(pil_image):
+    # Returns the valid EAN/UPC codes found in the image, normalised, in the
+    # order OpenCV reports them.
+    detector = _get_detector()
+    if detector is None:
+        return []
+    gray = np.asarray(pil_image if pil_image.mode == "L" else pil_image.convert("L"))
+    try:
+        if hasattr(detector, "detectAndDecodeWithType"):
+            ok, infos, types, _ = detector.detectAndDecodeWithType(gray)
+        else:
+            ok, infos, types, _ = detector.detectAndDecode(gray)
+    except cv2.error:
+        return []
+    if not ok:
+        return []
+
+    codes = []
+    for info, kind in zip(infos, types):
+        if not info:
+            continue
+        if isinstance(kind, str) and kind not in RETAIL_TYPES:
+            continue
+        code = canonical_code(info, kind if isinstance(kind, str) else None)
+        if code and code not in codes:
+            codes.append(code)
+    return codes
+
+
+class BarcodeCatalogue:
+    # Barcode -> product details, learned from entries the user confirmed
+    # with "Save to Inventory". A known code resolves the product without
+    # OCR or the LLM.
+
+    def __init__(self, path=CATALOGUE_FILE):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._products = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._products = json.load(f)
+            except Exception:
+                self._products = {}
+
+    def lookup(self, code):
+        with self._lock:
+            product = self._products.get(canonical_code(code) or code)
+            if product is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(product)
+
+    def find(self, codes):
+        # (code, details) for the first known code, else (None, None).
+        for code in codes:
+            product = self.lookup(code)
+            if product is not None:
+                return code, product
+        return None, None
+
+    def remember(self, code, name, category, quantity):
+        code = canonical_code(code)
+        if code is None:
+            return
+        with self._lock:
+            self._products[code] = {
+                "name": name, "category": category, "quantity": quantity
+            }
+            if not self.path:
+                return
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._products, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def stats(self):
+        with self._lock:
+            return {"products": len(self._products), "hits": self.hits, "misses": self.misses}
+
+
+def get_barcode_catalogue():
+    global _catalogue
+    with _catalogue_lock:
+        if _catalogue is None:
+            _catalogue = BarcodeCatalogue()
+        return _catalogue
@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import llm_utils
+from expiry_parser import parse_expiry_date
+from mock_ollama import MockOllama
+from ocr_utils import extract_text_multiconfig, limit_tesseract_threads, preprocess_image
+from pipeline import PRODUCT_MAX_TOKENS, PRODUCT_SCHEMA, PRODUCT_SYSTEM, build_product_prompt, process_image_pair
+from storage import SQLiteInventoryStore, set_store, upsert_item
+
+# End-to-end timings for the add-product path on synthetic labels, with the
+# LLM replaced by mock_ollama so runs are comparable across machines and
+# commits. Results are written as JSON; --baseline compares against an
+# earlier run and exits non-zero on regressions.
+
+# (label lines, expiry text). Roughly half are resolved by the local
+# classifier; the rest go to the (mock) LLM.
+CORPUS = [
+    (["aromatischer", "BASMATI-REIS", "1kg"], "MHD 05.2026 L2231"),
+    (["MACCOFFEE", "3in1 Original", "100g"], "EXP: OCT-2025"),
+    (["MDH", "GARAM MASALA", "100g"], "BEST BEFORE DEC 2027"),
+    (["Jasmine Rice", "Premium", "5kg"], "Mindestens haltbar bis 02.2027"),
+    (["Bio Vollmilch", "3,8% Fett", "1 L"], "31.07.2026 14:22"),
+    (["Penne Rigate", "No. 73", "500g"], "USE BY NOV 2025"),
+    (["Kichererbsen", "Getrocknet", "500 g"], "MHD: 09.2025"),
+    (["Greek Style Yogurt", "0% Fat", "450g"], "EXP 03/2026"),
+]
+IMAGE_SIZE = (1200, 900)
+SEED = 1234
+
+STAGES = ("preprocess_image", "extract_text_multiconfig", "parse_expiry_date", "ask_llm", "add_product")
+# Relative slowdown of p50/p95 (or drop in throughput) that counts as a
+# regression when comparing against a baseline.
+DEFAULT_THRESHOLD = 0.15
+
+
+def render_label(lines, rng, size=IMAGE_SIZE):
+    # A label photo with known text: tinted background, dark text, slight
+    # blur and sensor noise.
+    width, height = size
+    background = tuple(int(c) for c in rng.integers(170, 235, 3))
+    image = Image.new("RGB", size, background)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=height // 14)
+    top = height // 5
+    for i, line in enumerate(lines):
+        draw.text((width // 10, top + i * height // 6), line, fill=(25, 25, 25), font=font)
+    image = image.filter(ImageFilter.GaussianBlur(0.8))
+    pixels = np.asarray(image, dtype=np.float32) + rng.normal(0, 4.0, (height, width, 3))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert("L")
+
+def build_corpus(rng):
+    return [
+        {"product": render_label(lines, rng), "expiry": render_label([expiry], rng), "expiry_text": expiry}
+        for lines, expiry in CORPUS
+    ]
+
+def summarize(durations, items_per_call=1):
+    # Latency percentiles in milliseconds and calls (or items) per second.
+    values = np.asarray(durations, dtype=np.float64)
+    return {
+        "n": int(values.size),
+        "p50_ms": float(np.percentile(values, 50) * 1000),
+        "p95_ms": float(np.percentile(values, 95) * 1000),
+        "mean_ms": float(values.mean() * 1000),
+        "throughput_per_s": float(values.size * items_per_call / values.sum()) if values.sum() else 0.0,
+    }
+
+def timed_calls(func, inputs, rounds, warmup=1):
+    for value in inputs[:warmup]:
+        func(value)
+    durations = []
+    for _ in range(rounds):
+        for value in inputs:
+            start = time.perf_counter()
+            func(value)
+            durations.append(time.perf_counter() - start)
+    return durations
+
+def tesseract_available():
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+def run_suite(rounds, parse_rounds, mock_options):
+    rng = np.random.default_rng(SEED)
+    corpus = build_corpus(rng)
+    results = {}
+    skipped = {}
+
+    images = [(item["product"], "product") for item in corpus] + [(item["expiry"], "expiry") for item in corpus]
+    results["preprocess_image"] = summarize(
+        timed_calls(lambda entry: preprocess_image(*entry), images, rounds)
+    )
+
+    have_ocr = tesseract_available()
+    if have_ocr:
+        processed = [preprocess_image(image, mode) for image, mode in images]
+        results["extract_text_multiconfig"] = summarize(
+            timed_calls(extract_text_multiconfig, processed, rounds)
+        )
+    else:
+        skipped["extract_text_multiconfig"] = "tesseract not installed"
+
+    texts = [item["expiry_text"] for item in corpus]
+    results["parse_expiry_date"] = summarize(timed_calls(parse_expiry_date, texts, parse_rounds))
+
+    with MockOllama(**mock_options) as mock:
+        llm_utils.OLLAMA_URL = mock.url
+        prompts = [build_product_prompt("\n".join(lines)) for lines, _ in CORPUS]
+        results["ask_llm"] = summarize(timed_calls(
+            lambda prompt: llm_utils.ask_llm(prompt, system=PRODUCT_SYSTEM, format=PRODUCT_SCHEMA,
+                                             num_predict=PRODUCT_MAX_TOKENS),
+            prompts, rounds
+        ))
+
+        if have_ocr:
+            def add_product(item):
+                details = process_image_pair(item["product"], item["expiry"], use_cache=False)
+                upsert_item(details["name"], {
+                    "category": details["category"],
+                    "quantity": details["quantity"],
+                    "expiry": details["expiry"],
+                    "added_date": datetime.now().strftime("%d-%m-%Y")
+                })
+            results["add_product"] = summarize(timed_calls(add_product, corpus, rounds))
+        else:
+            skipped["add_product"] = "tesseract not installed"
+
+    return results, skipped
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+def compare(baseline, current, threshold):
+    # Returns [(stage, metric, old, new, change)] for every regression.
+    regressions = []
+    for stage, new in current["results"].items():
+        old = baseline.get("results", {}).get(stage)
+        if not old:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if old[metric] > 0:
+                change = new[metric] / old[metric] - 1
+                if change > threshold:
+                    regressions.append((stage, metric, old[metric], new[metric], change))
+        if old["throughput_per_s"] > 0:
+            change = new["throughput_per_s"] / old["throughput_per_s"] - 1
+            if change < -threshold:
+                regressions.append((stage, "throughput_per_s", old["throughput_per_s"],
+                                    new["throughput_per_s"], change))
+    return regressions
+
+def print_results(data):
+    print(f"{'stage':<26}{'n':>6}{'p50 ms':>11}{'p95 ms':>11}{'per s':>11}")
+    for stage in STAGES:
+        result = data["results"].get(stage)
+        if result:
+            print(f"{stage:<26}{result['n']:>6}{result['p50_ms']:>11.3f}{result['p95_ms']:>11.3f}"
+                  f"{result['throughput_per_s']:>11.1f}")
+        else:
+            print(f"{stage:<26}  skipped: {data['skipped'].get(stage, 'not run')}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end ingestion benchmark against a mock Ollama.")
+    parser.add_argument("--rounds", type=int, default=3, help="Passes over the corpus per stage")
+    parser.add_argument("--parse-rounds", type=int, default=500, help="Passes for the (fast) expiry parser")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock LLM fixed latency in seconds")
+    parser.add_argument("--token-rate", type=float, default=40.0, help="Mock LLM tokens per second")
+    parser.add_argument("--prompt-rate", type=float, default=2000.0, help="Mock LLM prompt tokens per second")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative slowdown before a stage counts as regressed")
+    args = parser.parse_args(argv)
+
+    limit_tesseract_threads()
+    mock_options = {"latency": args.latency, "token_rate": args.token_rate, "prompt_rate": args.prompt_rate}
+    output = os.path.abspath(args.output)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    # Caches, the product dictionary and the inventory are created in a
+    # scratch directory so runs start cold and leave the real data alone.
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            store = SQLiteInventoryStore(os.path.join(tmp, "bench.db"), migrate_from=None)
+            set_store(store)
+            results, skipped = run_suite(args.rounds, args.parse_rounds, mock_options)
+        finally:
+            set_store(None)
+            store.close()
+            os.chdir(previous_dir)
+
+    data = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "rounds": args.rounds,
+            "corpus_items": len(CORPUS),
+            "mock": mock_options,
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    print_results(data)
+    print(f"\nResults written to {output}")
+
+    if baseline is not None:
+        regressions = compare(baseline, data, args.threshold)
+        print(f"\nCompared with {baseline['meta'].get('commit')} (threshold {args.threshold:.0%}):")
+        if baseline["meta"].get("mock") != mock_options:
+            print("  warning: the baseline used different mock LLM settings")
+        for stage, metric, old, new, change in regressions:
+            print(f"  REGRESSION {stage} {metric}: {old:.3f} -> {new:.3f} ({change:+.0%})")
+        if regressions:
+            return 1
+        print("  no regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
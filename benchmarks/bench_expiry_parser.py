@@ -0,0 +1,158 @@
+import argparse
+import calendar
+import json
+import os
+import re
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from expiry_parser import parse_expiry_date
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "expiry_corpus.json")
+
+# The parser as it shipped before expiry_parser.py, kept verbatim as the
+# reference for output compatibility and speed.
+def legacy_parse_expiry_date(text):
+    patterns = [
+        r'(\d{2})\.(\d{4})',
+        r'(\d{2})/(\d{4})',
+        r'EXP[:\s]*([A-Z]{3,9})[-\s\.]*(\d{4})',
+        r'EXP[:\s]*(\d{2}[-/\.]\d{2}[-/\.]\d{4})',
+        r'BEST\s*BEFORE[:\s]*([A-Z]{3,9})[-\s\.]*(\d{4})',
+        r'USE\s*BY[:\s]*([A-Z]{3,9})[-\s\.]*(\d{4})',
+        r'HALTBAR\s*BIS[:\s]*(\d{2}[-/\.]\d{4})',
+        r'MHD[:\s]*(\d{2}[-/\.]\d{4})',
+        r'\b([A-Z]{3,9})[-\s\.]+(\d{4})\b',
+    ]
+    
+    month_map = {
+        'JAN': 1, 'JANUARY': 1, 'FEB': 2, 'FEBRUARY': 2,
+        'MAR': 3, 'MARCH': 3, 'APR': 4, 'APRIL': 4, 'MAY': 5,
+        'JUN': 6, 'JUNE': 6, 'JUL': 7, 'JULY': 7,
+        'AUG': 8, 'AUGUST': 8, 'SEP': 9, 'SEPT': 9, 'SEPTEMBER': 9,
+        'OCT': 10, 'OCTOBER': 10, 'NOV': 11, 'NOVEMBER': 11,
+        'DEC': 12, 'DECEMBER': 12
+    }
+    
+    text_upper = text.upper()
+    
+    for pattern in patterns:
+        match = re.search(pattern, text_upper)
+        if match:
+            try:
+                groups = match.groups()
+                
+                if len(groups) == 2 and groups[0].isdigit() and len(groups[0]) == 2:
+                    month = int(groups[0])
+                    year = int(groups[1])
+                    if 1 <= month <= 12:
+                        last_day = calendar.monthrange(year, month)[1]
+                        return f"{last_day:02d}-{month:02d}-{year}"
+                
+                if len(groups) == 2 and groups[0] in month_map:
+                    month = month_map[groups[0]]
+                    year = int(groups[1])
+                    last_day = calendar.monthrange(year, month)[1]
+                    return f"{last_day:02d}-{month:02d}-{year}"
+                
+                if len(groups) == 1 and '-' in groups[0]:
+                    date_str = groups[0].replace(' ', '-').replace('.', '-').replace('/', '-')
+                    parts = date_str.split('-')
+                    
+                    if len(parts) == 2:
+                        month_str, year_str = parts
+                        
+                        if month_str in month_map:
+                            month = month_map[month_str]
+                            year = int(year_str)
+                            last_day = calendar.monthrange(year, month)[1]
+                            return f"{last_day:02d}-{month:02d}-{year}"
+                        
+                        try:
+                            month = int(month_str)
+                            year = int(year_str)
+                            if 1 <= month <= 12:
+                                last_day = calendar.monthrange(year, month)[1]
+                                return f"{last_day:02d}-{month:02d}-{year}"
+                        except:
+                            pass
+            except:
+                continue
+    
+    return None
+
+def load_corpus(path=CORPUS_FILE):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def check_outputs(corpus):
+    failures = []
+    for case in corpus:
+        result = parse_expiry_date(case["text"])
+        if result != case["expected"]:
+            failures.append((case["text"], "expected", case["expected"], result))
+        if case["legacy"]:
+            legacy = legacy_parse_expiry_date(case["text"])
+            if result != legacy:
+                failures.append((case["text"], "legacy", legacy, result))
+    return failures
+
+def unique_tag(index):
+    # Letters only, appended after the label text, so the parse result does
+    # not change (check_unique verifies it).
+    tag = ""
+    while True:
+        tag = string.ascii_uppercase[index % 26] + tag
+        index //= 26
+        if not index:
+            return "ZQ" + tag
+
+def unique_texts(texts, scale):
+    # Every string distinct, so no run is helped by repeated labels.
+    return [f"{text} {unique_tag(i * len(texts) + j)}" for i in range(scale) for j, text in enumerate(texts)]
+
+def check_unique(texts, scale):
+    return [text for text, unique in zip(texts * scale, unique_texts(texts, scale))
+            if parse_expiry_date(text) != parse_expiry_date(unique)]
+
+def bench(func, texts, repeat):
+    timer = timeit.Timer(lambda: func(texts))
+    seconds = min(timer.repeat(repeat=repeat, number=1))
+    return len(texts) / seconds
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the expiry parser against the legacy implementation.")
+    parser.add_argument("--scale", type=int, default=200, help="Times the corpus is repeated per run")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs; the best one is reported")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus()
+    failures = check_outputs(corpus)
+    for text, kind, wanted, got in failures:
+        print(f"MISMATCH ({kind}) {text!r}: wanted {wanted!r}, got {got!r}")
+
+    legacy_cases = [case["text"] for case in corpus if case["legacy"]]
+    all_cases = [case["text"] for case in corpus]
+    for text in check_unique(all_cases, 1):
+        print(f"MISMATCH (unique tag) {text!r}")
+        failures.append(text)
+
+    legacy_rate = bench(lambda texts: [legacy_parse_expiry_date(t) for t in texts],
+                        unique_texts(legacy_cases, args.scale), args.repeat)
+    new_rate = bench(lambda texts: [parse_expiry_date(t) for t in texts],
+                     unique_texts(legacy_cases, args.scale), args.repeat)
+    all_rate = bench(lambda texts: [parse_expiry_date(t) for t in texts],
+                     unique_texts(all_cases, args.scale), args.repeat)
+
+    print(f"corpus: {len(corpus)} strings ({len(legacy_cases)} legacy-compatible), "
+          f"{args.scale} unique variants each")
+    print(f"legacy parse_expiry_date:   {legacy_rate:12,.0f} strings/s")
+    print(f"parse_expiry_date:          {new_rate:12,.0f} strings/s  ({new_rate / legacy_rate:.2f}x)")
+    print(f"  whole corpus:             {all_rate:12,.0f} strings/s")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
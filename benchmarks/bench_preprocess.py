@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr_utils import load_image, preprocess_image
+
+# The preprocessing path as it shipped before load_image and the adaptive
+# denoiser, kept verbatim as the baseline.
+def legacy_preprocess_image(pil_image, mode="product"):
+    img = np.array(pil_image)
+    
+    if len(img.shape) == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    elif img.shape[2] == 4:
+        img = cv2.cvtColor(img, cv2.COLOR_RGBA2BGR)
+    
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    
+    if mode == "expiry":
+        gray = cv2.equalizeHist(gray)
+        gray = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
+        _, otsu = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return Image.fromarray(otsu)
+    else:
+        height, width = gray.shape
+        if height < 300:
+            scale = 300 / height
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        
+        gray = cv2.fastNlMeansDenoising(gray, None, 7, 7, 21)
+        kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
+        gray = cv2.filter2D(gray, -1, kernel)
+        gray = cv2.convertScaleAbs(gray, alpha=1.5, beta=10)
+        
+        return Image.fromarray(gray)
+
+def make_photo(path, width, height, noise):
+    # A phone-sized label shot: textured background, a few text lines and
+    # Gaussian sensor noise, saved as JPEG like a camera upload.
+    rng = np.random.default_rng(0)
+    image = Image.new("RGB", (width, height), (205, 195, 180))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=max(24, height // 30))
+    lines = ["aromatischer BASMATI-REIS", "Nettofüllmenge 1kg", "Mindestens haltbar bis: 05.2026", "L 2304 B"]
+    for i, line in enumerate(lines):
+        draw.text((width // 8, height // 4 + i * height // 12), line, fill=(20, 20, 20), font=font)
+    pixels = np.asarray(image, dtype=np.float32)
+    pixels = pixels + rng.normal(0, noise, pixels.shape)
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, "JPEG", quality=90)
+
+def run_variant(variant, path, mode):
+    tracemalloc.start()
+    start = time.perf_counter()
+    if variant == "legacy":
+        image = Image.open(path)
+        image.load()
+        legacy_preprocess_image(image, mode=mode)
+    else:
+        preprocess_image(load_image(path), mode=mode)
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": elapsed, "numpy_peak_mb": traced_peak / 2 ** 20, "peak_rss_mb": peak_rss_mb()}
+
+def peak_rss_mb():
+    # Peak resident memory of this process, which also covers PIL and OpenCV
+    # buffers that tracemalloc cannot see. VmHWM is reset on exec, unlike
+    # ru_maxrss which Linux carries over from the parent.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 1024.0
+
+def measure(variant, path, mode, repeat):
+    # Each run gets a fresh interpreter so peak RSS is not shared between
+    # variants.
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.check_output([
+            sys.executable, os.path.abspath(__file__), "--child", variant, path, mode
+        ])
+        runs.append(json.loads(output))
+    return {
+        "seconds": min(run["seconds"] for run in runs),
+        "numpy_peak_mb": max(run["numpy_peak_mb"] for run in runs),
+        "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare legacy and resolution-aware preprocessing.")
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", nargs=3, metavar=("VARIANT", "PATH", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_variant(*args.child)))
+        return 0
+
+    print(f"{'image':<12}{'mode':<9}{'variant':<9}{'time (s)':>10}{'numpy MB':>10}{'RSS MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, noise in (("clean", 0.0), ("noisy", 12.0)):
+            path = os.path.join(tmp, f"{label}.jpg")
+            make_photo(path, args.width, args.height, noise)
+            for mode in ("product", "expiry"):
+                for variant in ("legacy", "current"):
+                    result = measure(variant, path, mode, args.repeat)
+                    print(f"{label:<12}{mode:<9}{variant:<9}{result['seconds']:>10.2f}"
+                          f"{result['numpy_peak_mb']:>10.1f}{result['peak_rss_mb']:>9.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_utils
+from llm_utils import generate, get_session
+from pipeline import (EXPIRY_MAX_TOKENS, EXPIRY_SCHEMA, EXPIRY_SYSTEM, PRODUCT_MAX_TOKENS,
+                      PRODUCT_SCHEMA, PRODUCT_SYSTEM, build_expiry_prompt, build_product_prompt)
+
+# Measures what the system-prompt split saves in prompt evaluation, and what
+# a cold model load costs. Needs a running Ollama with llama3 pulled.
+
+PRODUCT_TEXTS = [
+    "aromatischer\nBASMATI-REIS\n1kg",
+    "MACCOFFEE\n3in1 Original\n100g",
+    "Bio Vollmilch\n3,8% Fett\n1 L",
+    "TATA TEA\nPremium\n250 g",
+    "MDH\nGaram Masala\n100g",
+    "Penne Rigate\nNo. 73\n500g",
+    "Kichererbsen\nGetrocknet\n500 g",
+    "Greek Style Yogurt\n0% Fat\n450g",
+]
+EXPIRY_TEXTS = [
+    "MHD 05.2026 L2231",
+    "EXP: OCT-2025",
+    "BEST BEFORE DEC 2027",
+    "mindestens haltbar bis 02/2027",
+    "USE BY NOV 2025 LOT 44A",
+    "EXP 03 2026",
+    "31-07-2026 14:22",
+    "Haltbar bis 09.2025",
+]
+
+# The prompts as they shipped before the system-prompt split, kept verbatim
+# as the baseline: the OCR text sits in the middle, so only the first line
+# or two can be shared between requests.
+def legacy_product_prompt(text):
+    return f"""IMPORTANT: This is a NEW product analysis. Forget any previous products.
+
+I will show you OCR text from a product label. The text may be in GERMAN or English.
+
+OCR Text from Product Label:
+'''
+{text}
+'''
+
+CRITICAL: If you see German words, translate them:
+- REIS = Rice
+- BASMATI-REIS or BASMATI REIS = Basmati Rice
+- KAFFEE = Coffee
+- MILCH = Milk
+- ZUCKER = Sugar
+
+Product Type Keywords:
+- Rice: RICE, REIS, BASMATI, JASMINE, BASMATI-REIS
+- Coffee: COFFEE, KAFFEE, ESPRESSO
+- Tea: TEA, TEE, CHAI
+- Spice: MASALA, CURRY, GEWÜRZ
+- Dairy: MILK, MILCH, YOGURT, KÄSE
+
+Task:
+1. Look at the OCR text - do you see "BASMATI" or "REIS"?
+2. If YES → name="Basmati Reis", category="Rice/Grains"
+3. Find quantity like "1kg", "500g", "1 kg", "500 g"
+
+Examples:
+- OCR has "aromatischer BASMATI-REIS 1kg" → name="Basmati Reis", category="Rice/Grains", quantity="1kg"
+- OCR has "MACCOFFEE 100g" → name="MacCoffee", category="Coffee", quantity="100g"
+
+Return ONLY JSON:
+{{
+  "name": "product name",
+  "category": "category",
+  "quantity": "amount or Unknown"
+}}
+
+JSON:"""
+
+def legacy_expiry_prompt(text):
+    return f"""Extract expiry date from OCR text.
+
+OCR Text:
+{text}
+
+Patterns to look for:
+- 02.2027 → February 2027
+- EXP: OCT-2025 → October 2025
+- MHD: 05.2026 → May 2026
+- DEC 2027 → December 2027
+
+IMPORTANT: If only month and year are given (e.g., "OCT 2025"), use the LAST day of that month.
+
+Examples:
+- OCT 2025 → 2025-10-31 (October has 31 days)
+- FEB 2026 → 2026-02-28 (February has 28 days in non-leap year)
+- APR 2027 → 2027-04-30 (April has 30 days)
+
+Return ONLY valid JSON:
+{{
+  "expiry": "DD-MM-YYYY"
+}}
+
+JSON:"""
+
+def unload_model():
+    get_session().post(llm_utils.OLLAMA_URL,
+                       json={"model": llm_utils.MODEL, "keep_alive": 0}, timeout=60)
+
+def measure(requests_):
+    # requests_: [(prompt, system, schema, num_predict)]
+    rows = []
+    for prompt, system, schema, num_predict in requests_:
+        start = time.perf_counter()
+        result = generate(prompt, system=system, format=schema, num_predict=num_predict,
+                          timeout=llm_utils.WARMUP_TIMEOUT)
+        rows.append({
+            "wall": time.perf_counter() - start,
+            "prompt_tokens": result.get("prompt_eval_count", 0),
+            "prompt_eval": result.get("prompt_eval_duration", 0) / 1e9,
+            "load": result.get("load_duration", 0) / 1e9,
+        })
+    return rows
+
+def summarize(label, rows):
+    def median(key):
+        return statistics.median(row[key] for row in rows)
+    print(f"{label:<10} prompt tokens {median('prompt_tokens'):7.0f}   "
+          f"prompt eval {median('prompt_eval') * 1000:8.1f} ms   "
+          f"wall {median('wall') * 1000:8.1f} ms   (median of {len(rows)})")
+
+def legacy_requests(texts, kind):
+    if kind == "product":
+        return [(legacy_product_prompt(t), None, PRODUCT_SCHEMA, PRODUCT_MAX_TOKENS) for t in texts]
+    return [(legacy_expiry_prompt(t), None, EXPIRY_SCHEMA, EXPIRY_MAX_TOKENS) for t in texts]
+
+def split_requests(texts, kind):
+    if kind == "product":
+        return [(build_product_prompt(t), PRODUCT_SYSTEM, PRODUCT_SCHEMA, PRODUCT_MAX_TOKENS) for t in texts]
+    return [(build_expiry_prompt(t), EXPIRY_SYSTEM, EXPIRY_SCHEMA, EXPIRY_MAX_TOKENS) for t in texts]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure prompt-prefix reuse and model warm-up.")
+    parser.add_argument("--skip-cold", action="store_true", help="Do not unload the model to time a cold start")
+    args = parser.parse_args(argv)
+
+    if not args.skip_cold:
+        unload_model()
+        cold = measure(split_requests(PRODUCT_TEXTS[:1], "product"))[0]
+        print(f"cold start: {cold['wall']:.1f} s wall, {cold['load']:.1f} s model load "
+              f"(warm_up moves this off the first request; keep_alive={llm_utils.KEEP_ALIVE})")
+
+    # Same kind of request back to back, the way a batch of labels runs.
+    for kind, texts in (("product", PRODUCT_TEXTS), ("expiry", EXPIRY_TEXTS)):
+        print(f"\n{kind} prompts")
+        legacy = measure(legacy_requests(texts, kind))
+        split = measure(split_requests(texts, kind))
+        # The first split request evaluates the system prompt; the rest reuse it.
+        summarize("legacy", legacy[1:])
+        summarize("split", split[1:])
+        saved = statistics.median(r["prompt_eval"] for r in legacy[1:]) - \
+            statistics.median(r["prompt_eval"] for r in split[1:])
+        print(f"saved      {saved * 1000:8.1f} ms of prompt evaluation per request")
+
+if __name__ == "__main__":
+    main()
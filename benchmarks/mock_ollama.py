@@ -0,0 +1,177 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A stand-in for Ollama's /api/generate with predictable timing, so
+# benchmarks measure this code rather than the GPU. Every request costs
+# latency + prompt_tokens / prompt_rate + answer_tokens / token_rate seconds;
+# the first one also pays load_time, like a cold model.
+
+CHARS_PER_TOKEN = 4
+
+PRODUCT_ANSWER = {"name": "Mock Product", "category": "Pantry", "quantity": "500g"}
+EXPIRY_ANSWER = {"expiry": "31-05-2026"}
+SHELF_LIFE_ANSWER = {"days": 7, "storage_tip": "Keep refrigerated"}
+PLAN_ANSWER = {"plans": []}
+TEXT_ANSWER = ("Use it within the next few days: cook it with what you have, "
+               "store leftovers in the fridge and finish them within two days.")
+
+
+def answer_for(system, prompt):
+    # Canned answers keyed on the instruction text of the app's prompts.
+    text = f"{system}\n{prompt}"
+    if not prompt.strip():
+        return ""
+    if "Extract expiry date" in text:
+        return json.dumps(EXPIRY_ANSWER)
+    if "shelf life" in text:
+        return json.dumps(SHELF_LIFE_ANSWER)
+    if '"plans"' in text:
+        return json.dumps(PLAN_ANSWER)
+    if "product label" in text:
+        return json.dumps(PRODUCT_ANSWER)
+    return TEXT_ANSWER
+
+def split_tokens(text):
+    return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+class MockOllama:
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, token_rate=40.0,
+                 prompt_rate=2000.0, load_time=0.0):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.prompt_rate = prompt_rate
+        self.load_time = load_time
+        self.requests = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/generate"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _first_request(self):
+        with self._lock:
+            self.requests += 1
+            first, self._loaded = not self._loaded, True
+        return first
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if self.path != "/api/generate":
+                    self.send_json(404, {"error": "not found"})
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                mock.handle(self, body)
+
+            def send_json(self, status, data):
+                payload = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def write_chunk(self, data):
+                payload = (json.dumps(data) + "\n").encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+                self.wfile.flush()
+
+        return Handler
+
+    def handle(self, handler, body):
+        load = self.load_time if self._first_request() else 0.0
+        system = body.get("system") or ""
+        prompt = body.get("prompt") or ""
+        prompt_tokens = (len(system) + len(prompt)) // CHARS_PER_TOKEN + 1
+        tokens = split_tokens(answer_for(system, prompt))
+        num_predict = (body.get("options") or {}).get("num_predict")
+        if num_predict is not None and num_predict >= 0:
+            tokens = tokens[:num_predict]
+
+        prompt_seconds = prompt_tokens / self.prompt_rate
+        time.sleep(self.latency + load + prompt_seconds)
+        stats = {
+            "model": body.get("model"),
+            "done": True,
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_seconds * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(len(tokens) / self.token_rate * 1e9),
+        }
+
+        if not body.get("stream", True):
+            time.sleep(len(tokens) / self.token_rate)
+            handler.send_json(200, dict(stats, response="".join(tokens)))
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+        try:
+            for token in tokens:
+                time.sleep(1.0 / self.token_rate)
+                handler.write_chunk({"model": body.get("model"), "response": token, "done": False})
+            handler.write_chunk(dict(stats, response=""))
+            handler.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading early (see llm_utils.ask_llm_json).
+            handler.close_connection = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a mock Ollama /api/generate endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.05, help="Fixed seconds added to every request")
+    parser.add_argument("--token-rate", type=float, default=40.0, help="Generated tokens per second")
+    parser.add_argument("--prompt-rate", type=float, default=2000.0, help="Prompt tokens evaluated per second")
+    parser.add_argument("--load-time", type=float, default=0.0, help="Extra seconds for the first request")
+    args = parser.parse_args(argv)
+
+    mock = MockOllama(args.host, args.port, args.latency, args.token_rate, args.prompt_rate, args.load_time)
+    print(f"Mock Ollama on {mock.url} (set OLLAMA_URL to use it)")
+    try:
+        mock.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import bisect
+from datetime import datetime
+
+EXPIRY_FORMAT = "%d-%m-%Y"
+
+def expiry_ordinal(expiry):
+    if not expiry or expiry == "Unknown":
+        return None
+    try:
+        return datetime.strptime(expiry, EXPIRY_FORMAT).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+def days_until(ordinal, now=None):
+    # Same result as the (expiry - datetime.now()).days arithmetic the app
+    # has always used: an item is counted as expired from the start of its
+    # expiry day.
+    now = now or datetime.now()
+    return (datetime.fromordinal(ordinal) - now).days
+
+
+class ExpiryIndex:
+    # Items kept sorted by expiry date, updated on every add/remove, so
+    # "expired", "expiring within N days" and "most urgent" are bisect range
+    # queries instead of a strptime over the whole inventory.
+
+    def __init__(self, inventory=None):
+        self._entries = []
+        self._ordinals = {}
+        for name, details in (inventory or {}).items():
+            self.add(name, details)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return name in self._ordinals
+
+    def add(self, name, details):
+        self.put(name, expiry_ordinal(details.get("expiry")))
+
+    def put(self, name, ordinal):
+        # For callers that already hold the parsed date (inventory_model).
+        self.remove(name)
+        if ordinal is None:
+            return
+        bisect.insort(self._entries, (ordinal, name))
+        self._ordinals[name] = ordinal
+
+    def remove(self, name):
+        ordinal = self._ordinals.pop(name, None)
+        if ordinal is None:
+            return
+        i = bisect.bisect_left(self._entries, (ordinal, name))
+        del self._entries[i]
+
+    def days_left(self, name, now=None):
+        ordinal = self._ordinals.get(name)
+        if ordinal is None:
+            return None
+        return days_until(ordinal, now)
+
+    def _cutoff(self, ordinal):
+        # Index of the first entry expiring on or after the given day.
+        return bisect.bisect_left(self._entries, (ordinal,))
+
+    def expired(self, now=None):
+        now = now or datetime.now()
+        end = self._cutoff(now.toordinal() + 1)
+        return [(name, abs(days_until(ordinal, now))) for ordinal, name in self._entries[:end]]
+
+    def expiring_within(self, days, now=None):
+        now = now or datetime.now()
+        start = self._cutoff(now.toordinal() + 1)
+        end = self._cutoff(now.toordinal() + 1 + days)
+        return [(name, days_until(ordinal, now)) for ordinal, name in self._entries[start:end]]
+
+    def most_urgent(self, k, now=None, include_expired=False):
+        now = now or datetime.now()
+        start = 0 if include_expired else self._cutoff(now.toordinal() + 1)
+        return [(name, days_until(ordinal, now)) for ordinal, name in self._entries[start:start + k]]
@@ -0,0 +1,135 @@
+import calendar
+import re
+from datetime import date
+
+MONTHS = {
+    'JAN': 1, 'JANUARY': 1, 'FEB': 2, 'FEBRUARY': 2,
+    'MAR': 3, 'MARCH': 3, 'APR': 4, 'APRIL': 4, 'MAY': 5,
+    'JUN': 6, 'JUNE': 6, 'JUL': 7, 'JULY': 7,
+    'AUG': 8, 'AUGUST': 8, 'SEP': 9, 'SEPT': 9, 'SEPTEMBER': 9,
+    'OCT': 10, 'OCTOBER': 10, 'NOV': 11, 'NOVEMBER': 11,
+    'DEC': 12, 'DECEMBER': 12
+}
+
+# Every supported form contains at least two adjacent digits, so text
+# without them is rejected before any of the patterns run.
+_HAS_DIGITS = re.compile(r'\d\d')
+
+def _end_of_month(month, year):
+    last_day = calendar.monthrange(year, month)[1]
+    return f"{last_day:02d}-{month:02d}-{year}"
+
+_FULL_DATE_BODY = r'(?P<day>\d{1,2})(?P<sep>[./-])(?P<month>\d{1,2})(?P=sep)(?P<year>\d{4}|\d{2})(?!\d)'
+_FULL_DATE = re.compile(r'(?<!\d)' + _FULL_DATE_BODY)
+
+# Words that introduce the expiry on a label. A full date straight after one
+# of them is the expiry; a full date anywhere else may be a packing date or
+# a lot code, so it is only read when the label names no expiry at all.
+_MARKER = (r'(?<![A-Z])(?:EXP(?:IRY)?|BEST\s*BEFORE(?:\s*END)?|BB|USE\s*BY|MHD'
+           r'|HALTBAR\s*BIS|VERBRAUCHEN\s*BIS)(?![A-Z])')
+_HAS_MARKER = re.compile(_MARKER)
+_MARKED_DATE = re.compile(_MARKER + r'(?:\s*DATE)?[:.\s]*' + _FULL_DATE_BODY)
+
+def _to_date(match):
+    year_str = match.group('year')
+    year = int(year_str) + 2000 if len(year_str) == 2 else int(year_str)
+    try:
+        return date(year, int(match.group('month')), int(match.group('day')))
+    except ValueError:
+        return None
+
+def _format(value):
+    return f"{value.day:02d}-{value.month:02d}-{value.year}"
+
+def _marked_date(text_upper):
+    # DD.MM.YYYY, DD/MM/YY, DD-MM-YYYY ... after an expiry marker. When
+    # several are marked the latest one is the expiry.
+    dates = [value for value in map(_to_date, _MARKED_DATE.finditer(text_upper)) if value]
+    return max(dates) if dates else None
+
+def _full_dates(text_upper):
+    # (start, end, date) of every valid full date, marked or not.
+    found = []
+    for match in _FULL_DATE.finditer(text_upper):
+        value = _to_date(match)
+        if value:
+            found.append((match.start(), match.end(), value))
+    return found
+
+def _numeric_month_year(match):
+    month = int(match.group(1))
+    if 1 <= month <= 12:
+        return _end_of_month(month, int(match.group(2)))
+    return None
+
+def _named_month_year(match):
+    month = MONTHS.get(match.group(1))
+    if month is None:
+        return None
+    return _end_of_month(month, int(match.group(2)))
+
+def _dashed_month_year(match):
+    # HALTBAR BIS / MHD captures; only "-" separated values are read here,
+    # "." and "/" forms are already caught by the numeric patterns above.
+    value = match.group(1)
+    if '-' not in value:
+        return None
+    month_str, year_str = value.split('-')
+    month = int(month_str)
+    if 1 <= month <= 12:
+        return _end_of_month(month, int(year_str))
+    return None
+
+# Month/year forms, tried in order after marked full dates. The first
+# pattern whose first match yields a date wins, keeping the priority of the
+# original parser so labels it already understood produce the same result.
+_PATTERNS = [
+    (re.compile(r'(\d{2})\.(\d{4})'), _numeric_month_year),
+    (re.compile(r'(\d{2})/(\d{4})'), _numeric_month_year),
+    (re.compile(r'EXP[:\s]*([A-Z]{3,9})[-\s\.]*(\d{4})'), _named_month_year),
+    (re.compile(r'BEST\s*BEFORE[:\s]*([A-Z]{3,9})[-\s\.]*(\d{4})'), _named_month_year),
+    (re.compile(r'USE\s*BY[:\s]*([A-Z]{3,9})[-\s\.]*(\d{4})'), _named_month_year),
+    (re.compile(r'HALTBAR\s*BIS[:\s]*(\d{2}[-/\.]\d{4})'), _dashed_month_year),
+    (re.compile(r'MHD[:\s]*(\d{2}[-/\.]\d{4})'), _dashed_month_year),
+    (re.compile(r'\b([A-Z]{3,9})[-\s\.]+(\d{4})\b'), _named_month_year),
+]
+
+def _inside(start, end, spans):
+    return any(span_start <= start and end <= span_end for span_start, span_end in spans)
+
+def _month_year(text_upper, date_spans):
+    # The month/year the original parser would have returned, except that
+    # digits belonging to a full date are skipped: "05.2026" read out of a
+    # packing date "12.05.2026" is not a month/year of its own.
+    for pattern, handler in _PATTERNS:
+        match = pattern.search(text_upper)
+        while match and date_spans and _inside(match.start(1), match.end(), date_spans):
+            match = pattern.search(text_upper, match.start() + 1)
+        if match:
+            try:
+                result = handler(match)
+            except:
+                continue
+            if result:
+                return result
+    return None
+
+# Not traced: a span costs more than the parse itself. Callers record one
+# per label read (pipeline.read_expiry_label).
+def parse_expiry_date(text):
+    # Precedence: a full date after an expiry marker, then a month/year in
+    # the original parser's order, then, on labels without any marker, the
+    # latest full date.
+    if not text or not _HAS_DIGITS.search(text):
+        return None
+    text_upper = text.upper()
+    full_dates = _full_dates(text_upper)
+    marked = full_dates and _marked_date(text_upper)
+    if marked:
+        return _format(marked)
+    result = _month_year(text_upper, [(start, end) for start, end, _ in full_dates])
+    if result:
+        return result
+    if full_dates and not _HAS_MARKER.search(text_upper):
+        return _format(max(value for _, _, value in full_dates))
+    return None
@@ -0,0 +1,123 @@
+import heapq
+import os
+import tempfile
+import cv2
+import numpy as np
+from PIL import Image
+from ocr_utils import MAX_IMAGE_SIDE, load_image
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v", ".avi", ".webm", ".mkv")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Frames are scored on a copy this wide; focus and glare rank the same at
+# this size and scoring stays around a millisecond per frame.
+SCORE_WIDTH = 640
+# Grey level from which a pixel counts as specular highlight, and how hard
+# highlights are penalised: score = sharpness * (1 - GLARE_PENALTY * ratio).
+GLARE_LEVEL = 250
+GLARE_PENALTY = 4.0
+# At most this many frames are sampled from a video, evenly spaced.
+MAX_VIDEO_FRAMES = 60
+TOP_FRAMES = 2
+
+
+def score_frame(gray):
+    # gray: 2-D uint8 array. Sharpness is the variance of the Laplacian
+    # (blur removes the high frequencies it responds to); glare is the
+    # share of blown-out pixels, which wipe out printed dates.
+    height, width = gray.shape
+    if width > SCORE_WIDTH:
+        scale = SCORE_WIDTH / width
+        gray = cv2.resize(gray, (SCORE_WIDTH, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    glare = cv2.countNonZero(cv2.inRange(gray, GLARE_LEVEL, 255)) / float(gray.size)
+    return {
+        "sharpness": sharpness,
+        "glare": glare,
+        "score": sharpness * max(0.0, 1.0 - GLARE_PENALTY * glare),
+    }
+
+def _to_gray_array(frame):
+    if isinstance(frame, Image.Image):
+        return np.asarray(frame if frame.mode == "L" else frame.convert("L"))
+    if frame.ndim == 3:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return frame
+
+def _fit(gray, max_side=MAX_IMAGE_SIDE):
+    longest = max(gray.shape)
+    if longest <= max_side:
+        return gray
+    scale = max_side / longest
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+def video_frames(path, max_frames=MAX_VIDEO_FRAMES):
+    # Yields grayscale frames sampled evenly across the clip. Skipped frames
+    # are only grabbed, not decoded into images.
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video {path}")
+    try:
+        total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or max_frames
+        step = max(1, total // max_frames)
+        index = 0
+        while True:
+            if not capture.grab():
+                break
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    yield _fit(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+            index += 1
+    finally:
+        capture.release()
+
+def burst_frames(sources):
+    # Each source is a path or file object of a still image.
+    for source in sources:
+        yield np.asarray(load_image(source))
+
+def is_capture_source(path):
+    # True for a video file or a directory of burst photos.
+    return os.path.isdir(path) or os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+def capture_frames(path):
+    if os.path.isdir(path):
+        names = sorted(name for name in os.listdir(path)
+                       if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+        return burst_frames(os.path.join(path, name) for name in names)
+    return video_frames(path)
+
+def select_frames(frames, top=TOP_FRAMES):
+    # Scores every frame and keeps only the best `top` in memory. Returns
+    # [(PIL image, score dict)] best first, plus the number of frames seen.
+    best = []
+    seen = 0
+    for index, frame in enumerate(frames):
+        gray = _to_gray_array(frame)
+        score = score_frame(gray)
+        entry = (score["score"], -index, gray, score)
+        if len(best) < top:
+            heapq.heappush(best, entry)
+        elif entry[:2] > best[0][:2]:
+            heapq.heapreplace(best, entry)
+        seen += 1
+    best.sort(key=lambda entry: entry[:2], reverse=True)
+    return [(Image.fromarray(gray), score) for _, _, gray, score in best], seen
+
+def file_frames(files):
+    # Frames from uploaded file objects (anything with .name and .read()):
+    # still images are decoded directly, videos go through a temporary file
+    # because OpenCV only reads video from a path.
+    for upload in files:
+        ext = os.path.splitext(upload.name)[1].lower()
+        if ext not in VIDEO_EXTENSIONS:
+            yield np.asarray(load_image(upload))
+            continue
+        fd, path = tempfile.mkstemp(suffix=ext)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(upload.read())
+            yield from video_frames(path)
+        finally:
+            os.remove(path)
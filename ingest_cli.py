@@ -0,0 +1,221 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from frame_selection import VIDEO_EXTENSIONS, capture_frames, is_capture_source, select_frames
+from metrics import get_registry
+from ocr_utils import limit_tesseract_threads, load_image
+from pipeline import process_candidates
+from storage import upsert_items
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+# OCR engines / threads per worker process. The process pool already uses
+# every core, so each worker reading one image at a time is enough.
+OCR_WORKERS_PER_PROCESS = 1
+STAGES = ("decode", "select", "barcode", "preprocess", "ocr", "parse", "llm")
+
+def discover_pairs(directory):
+    # Pairs are matched by file name: <id>_product.<ext> and <id>_expiry.<ext>.
+    # Either side may also be a video or a directory of burst photos, from
+    # which the sharpest frames are picked.
+    products = {}
+    expiries = {}
+    for filename in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(filename)
+        path = os.path.join(directory, filename)
+        if os.path.isdir(path):
+            stem = filename
+        elif ext.lower() not in IMAGE_EXTENSIONS + VIDEO_EXTENSIONS:
+            continue
+        if stem.endswith("_product"):
+            products[stem[:-len("_product")]] = path
+        elif stem.endswith("_expiry"):
+            expiries[stem[:-len("_expiry")]] = path
+
+    items = []
+    for item_id in sorted(products):
+        if item_id in expiries:
+            items.append({"id": item_id, "product": products[item_id], "expiry": expiries[item_id]})
+        else:
+            print(f"Skipping {item_id}: no expiry image", file=sys.stderr)
+    return items
+
+def read_manifest(path):
+    # A manifest is CSV or JSONL with id, product and expiry columns.
+    # Relative image paths are resolved against the manifest's directory.
+    base = os.path.dirname(os.path.abspath(path))
+    if path.lower().endswith(".csv"):
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    items = []
+    for index, row in enumerate(rows):
+        items.append({
+            "id": str(row.get("id") or index),
+            "product": os.path.join(base, row["product"]),
+            "expiry": os.path.join(base, row["expiry"])
+        })
+    return items
+
+def read_results(path):
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except:
+                continue
+            results[record.get("id")] = record
+    return results
+
+def load_candidates(path, timings, frames):
+    # A still image is its own only candidate; videos and burst directories
+    # are decoded and scored, and only the best frames are kept.
+    if not is_capture_source(path):
+        decode_start = time.perf_counter()
+        image = load_image(path)
+        timings["decode"] = timings.get("decode", 0.0) + time.perf_counter() - decode_start
+        return [image]
+    select_start = time.perf_counter()
+    selected, seen = select_frames(capture_frames(path))
+    timings["select"] = timings.get("select", 0.0) + time.perf_counter() - select_start
+    if not selected:
+        raise ValueError(f"No frames in {path}")
+    frames.append({"source": path, "seen": seen,
+                   "scores": [round(score["score"], 1) for _, score in selected]})
+    return [image for image, _ in selected]
+
+def process_item(item):
+    timings = {}
+    start = time.perf_counter()
+    record = {"id": item["id"], "product_image": item["product"], "expiry_image": item["expiry"]}
+    try:
+        frames = []
+        product_images = load_candidates(item["product"], timings, frames)
+        expiry_images = load_candidates(item["expiry"], timings, frames)
+        if frames:
+            record["frames"] = frames
+        record.update(process_candidates(product_images, expiry_images, timings=timings))
+    except Exception as e:
+        record["error"] = str(e)
+    timings["total"] = time.perf_counter() - start
+    record["timings"] = timings
+    # Spans recorded in this worker process travel back with the record.
+    record["_metrics"] = get_registry().snapshot(reset=True)
+    return record
+
+def init_worker(ocr_workers):
+    # Without this every worker process would size its tesseract pool and
+    # OCR thread pool for the whole machine: N processes x N engines.
+    os.environ["OCR_POOL_WORKERS"] = str(ocr_workers)
+    os.environ["OCR_THREADS"] = str(ocr_workers)
+
+def merge_results(results):
+    items = {}
+    for record in results.values():
+        # Unrecognised products still need a human review in the app.
+        if record.get("error") or record.get("name") in (None, "", "Unknown Product"):
+            continue
+        items[record["name"]] = {
+            "category": record["category"],
+            "quantity": record["quantity"],
+            "expiry": record["expiry"],
+            "added_date": datetime.now().strftime("%d-%m-%Y")
+        }
+    if not upsert_items(items):
+        print("Failed to save inventory", file=sys.stderr)
+        return 0
+    return len(items)
+
+def print_report(records, elapsed):
+    done = len(records)
+    failed = sum(1 for record in records if record.get("error"))
+    rate = done / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"Processed {done} items ({failed} failed) in {elapsed:.1f}s: {rate:.1f} items/min",
+          file=sys.stderr)
+    if not done:
+        return
+    for stage in STAGES + ("total",):
+        values = [record["timings"][stage] for record in records if stage in record["timings"]]
+        if values:
+            mean = sum(values) / len(values)
+            print(f"  {stage:<10} mean {mean:.3f}s  max {max(values):.3f}s  total {sum(values):.1f}s",
+                  file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Bulk-ingest product/expiry label image pairs without the Streamlit UI."
+    )
+    parser.add_argument("source", help="Directory of <id>_product/<id>_expiry images, or a CSV/JSONL manifest")
+    parser.add_argument("-o", "--output", default="ingest_results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--ocr-threads", type=int, default=OCR_WORKERS_PER_PROCESS,
+                        help="Tesseract engines per worker process")
+    parser.add_argument("--resume", action="store_true", help="Skip items already completed in the output file")
+    parser.add_argument("--overwrite", action="store_true", help="Start a new output file, discarding earlier results")
+    parser.add_argument("--merge", action="store_true", help="Merge successful results into the inventory when done")
+    parser.add_argument("--metrics", help="Write per-stage latency histograms here (.prom for Prometheus text, else JSON)")
+    args = parser.parse_args(argv)
+    limit_tesseract_threads()
+
+    if os.path.isdir(args.source):
+        items = discover_pairs(args.source)
+    else:
+        items = read_manifest(args.source)
+
+    if args.resume and args.overwrite:
+        parser.error("--resume and --overwrite cannot be combined")
+    if os.path.exists(args.output) and not (args.resume or args.overwrite):
+        # Earlier results may not have been merged yet.
+        print(f"{args.output} already exists: pass --resume to continue it or --overwrite to replace it",
+              file=sys.stderr)
+        return 2
+
+    if args.resume:
+        completed = {item_id for item_id, record in read_results(args.output).items() if not record.get("error")}
+        items = [item for item in items if item["id"] not in completed]
+        print(f"Resuming: {len(completed)} already done, {len(items)} remaining", file=sys.stderr)
+    elif os.path.exists(args.output):
+        open(args.output, 'w').close()
+
+    records = []
+    start = time.perf_counter()
+    with open(args.output, 'a', encoding='utf-8') as out, \
+            ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=init_worker,
+                                initargs=(max(1, args.ocr_threads),)) as executor:
+        futures = [executor.submit(process_item, item) for item in items]
+        for future in as_completed(futures):
+            record = future.result()
+            get_registry().merge(record.pop("_metrics", {}))
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            records.append(record)
+    elapsed = time.perf_counter() - start
+
+    print_report(records, elapsed)
+
+    if args.metrics:
+        registry = get_registry()
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            if args.metrics.endswith(".prom"):
+                f.write(registry.export_prometheus())
+            else:
+                f.write(registry.export_json())
+
+    if args.merge:
+        added = merge_results(read_results(args.output))
+        print(f"Merged {added} items into the inventory", file=sys.stderr)
+
+    return 1 if any(record.get("error") for record in records) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import base64
+import io
+import os
+import time
+import requests
+
+# Client for ingest_service. The app switches to it when INGEST_SERVICE_URL
+# is set, so OCR and LLM work runs in the service rather than the Streamlit
+# script.
+INGEST_SERVICE_URL = os.environ.get("INGEST_SERVICE_URL")
+REQUEST_TIMEOUT = 30
+POLL_INTERVAL = 0.25
+JOB_TIMEOUT = 300
+
+
+class IngestError(Exception):
+    pass
+
+
+def _encode(image):
+    # PIL images are sent as PNG; bytes are sent as they are.
+    if isinstance(image, bytes):
+        data = image
+    else:
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        data = buffer.getvalue()
+    return base64.b64encode(data).decode("ascii")
+
+
+class IngestClient:
+
+    def __init__(self, base_url=INGEST_SERVICE_URL, timeout=REQUEST_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _post(self, path, body, job_id=None, retries=3):
+        # 429 means the service queue is full; wait as long as it asks.
+        headers = {"Idempotency-Key": job_id} if job_id else {}
+        for attempt in range(retries + 1):
+            response = self.session.post(self.base_url + path, json=body, headers=headers,
+                                         timeout=self.timeout)
+            if response.status_code != 429 or attempt == retries:
+                break
+            time.sleep(float(response.headers.get("Retry-After", 1)))
+        if response.status_code >= 400:
+            raise IngestError(response.json().get("error", f"HTTP {response.status_code}"))
+        return response.json()
+
+    def submit_pair(self, product_images, expiry_images, save=True, job_id=None):
+        # Each side is a list of candidate images (PIL or encoded bytes), best first.
+        return self._post("/jobs/pair", {
+            "product": [_encode(image) for image in product_images],
+            "expiry": [_encode(image) for image in expiry_images],
+            "save": save,
+        }, job_id)
+
+    def submit_produce(self, name, category, quantity=1, save=True, job_id=None):
+        return self._post("/jobs/produce", {
+            "name": name, "category": category, "quantity": quantity, "save": save,
+        }, job_id)
+
+    def job(self, job_id):
+        response = self.session.get(f"{self.base_url}/jobs/{job_id}", timeout=self.timeout)
+        if response.status_code == 404:
+            raise IngestError(f"Unknown job {job_id}")
+        response.raise_for_status()
+        return response.json()
+
+    def wait(self, job, timeout=JOB_TIMEOUT, interval=POLL_INTERVAL):
+        # Polls until the job is done and returns its result.
+        deadline = time.monotonic() + timeout
+        while job["status"] not in ("done", "failed"):
+            if time.monotonic() > deadline:
+                raise IngestError(f"Job {job['id']} did not finish in {timeout}s")
+            time.sleep(interval)
+            job = self.job(job["id"])
+        if job["status"] == "failed":
+            raise IngestError(job.get("error") or "Job failed")
+        return job["result"]
+
+    def inventory(self, category=None, search=None):
+        params = {key: value for key, value in (("category", category), ("search", search)) if value}
+        response = self.session.get(self.base_url + "/inventory", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["items"]
+
+
+def get_ingest_client():
+    # None unless INGEST_SERVICE_URL is set.
+    return IngestClient() if INGEST_SERVICE_URL else None
@@ -0,0 +1,367 @@
+import argparse
+import base64
+import binascii
+import hashlib
+import io
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from llm_utils import warm_up
+from metrics import get_registry, increment, observe
+from ocr_utils import limit_tesseract_threads, load_image
+from pipeline import WARMUP_SYSTEM_PROMPTS, process_candidates
+from shelf_life import SHELF_LIFE_SYSTEM, estimate_expiry
+from storage import load_inventory, upsert_item
+
+# Headless ingestion: scanners (or the Streamlit app, see ingest_client)
+# POST label images or produce entries, get a job id back at once and poll
+# it. Jobs run on a fixed pool of worker threads behind a bounded queue;
+# when the queue is full new jobs are refused with 429 instead of piling up.
+#
+#   POST /jobs/pair     {"product": [b64, ...], "expiry": [b64, ...], "save": true}
+#   POST /jobs/produce  {"name": ..., "category": ..., "quantity": 1, "save": true}
+#   GET  /jobs/<id>     job status and, when done, the extracted details
+#   GET  /inventory     ?category=...&search=...
+#   GET  /health, GET /metrics (Prometheus text)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", "32"))
+# Finished jobs kept for polling and idempotent resubmission; the oldest
+# are forgotten first.
+MAX_FINISHED_JOBS = 1000
+MAX_BODY_BYTES = 32 * 1024 * 1024
+RETRY_AFTER = 5
+JOB_ID = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    # Jobs are dicts: id, kind, status (queued/running/done/failed),
+    # timestamps and, once finished, result or error. Resubmitting an id
+    # that is queued, running or done returns the existing job; an id whose
+    # job failed is queued again, so a retry is not stuck with the failure.
+
+    def __init__(self, runners, workers=DEFAULT_WORKERS, queue_size=QUEUE_SIZE,
+                 max_finished=MAX_FINISHED_JOBS):
+        self.runners = runners
+        self.workers = workers
+        self.max_finished = max_finished
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingest-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, job_id, kind, payload):
+        # Returns (job, created). Raises QueueFull when no slot is free.
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] != "failed":
+                return self._public(job), False
+            job = {
+                "id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "submitted": time.time(),
+                "started": None,
+                "finished": None,
+            }
+            try:
+                self._queue.put_nowait((job, payload))
+            except queue.Full:
+                increment("ingest_jobs_rejected_total", labels={"kind": kind})
+                raise QueueFull()
+            self._jobs.pop(job_id, None)
+            self._jobs[job_id] = job
+            return self._public(job), True
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._public(job) if job is not None else None
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"workers": self.workers, "queue_size": self._queue.maxsize,
+                "queued": self._queue.qsize(), "jobs": counts}
+
+    @staticmethod
+    def _public(job):
+        return dict(job)
+
+    def _work(self):
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                return
+            job, payload = entry
+            with self._lock:
+                job["status"] = "running"
+                job["started"] = time.time()
+            observe("ingest_queue_wait_seconds", job["started"] - job["submitted"], {"kind": job["kind"]})
+            try:
+                result = self.runners[job["kind"]](payload)
+                update = {"status": "done", "result": result}
+            except Exception as e:
+                logger.exception("Job %s failed", job["id"])
+                update = {"status": "failed", "error": str(e)}
+            with self._lock:
+                job.update(update, finished=time.time())
+                self._forget_finished()
+            increment("ingest_jobs_total", labels={"kind": job["kind"], "status": job["status"]})
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job["finished"] is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+
+def _decode_images(value, field):
+    # One base64 string or a list of them (candidate frames, best first).
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not value:
+        raise ValueError(f"'{field}' must be a base64 image or a list of them")
+    try:
+        return [load_image(io.BytesIO(base64.b64decode(data, validate=True))) for data in value]
+    except (binascii.Error, TypeError) as e:
+        raise ValueError(f"'{field}' is not valid base64: {e}")
+    except OSError as e:
+        raise ValueError(f"'{field}' is not a readable image: {e}")
+
+def _recognised(details):
+    return details.get("name") not in (None, "", "Unknown Product")
+
+def run_pair(payload):
+    timings = {}
+    details = process_candidates(payload["product"], payload["expiry"], timings=timings)
+    result = dict(details, timings=timings, saved=False)
+    # Like ingest_cli --merge: unrecognised products are left for review.
+    if payload.get("save", True) and _recognised(details):
+        result["saved"] = upsert_item(details["name"], {
+            "category": details["category"],
+            "quantity": details["quantity"],
+            "expiry": details["expiry"],
+            "added_date": datetime.now().strftime("%d-%m-%Y")
+        })
+    return result
+
+def run_produce(payload):
+    estimate = estimate_expiry(payload["name"], payload["category"], payload["quantity"])
+    details = {
+        "category": "Fresh Produce",
+        "quantity": f"{payload['quantity']} units",
+        "expiry": estimate["expiry"],
+        "added_date": datetime.now().strftime("%d-%m-%Y")
+    }
+    result = dict(details, name=payload["name"], days=estimate["days"],
+                  storage_tip=estimate["storage_tip"], saved=False)
+    if payload.get("save", True):
+        result["saved"] = upsert_item(payload["name"], details)
+    return result
+
+RUNNERS = {"pair": run_pair, "produce": run_produce}
+
+def parse_pair(body):
+    return {
+        "product": _decode_images(body.get("product"), "product"),
+        "expiry": _decode_images(body.get("expiry"), "expiry"),
+        "save": bool(body.get("save", True)),
+    }
+
+def parse_produce(body):
+    name = body.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("'name' is required and must be a string")
+    category = body.get("category") or "Vegetables"
+    if not isinstance(category, str):
+        raise ValueError("'category' must be a string")
+    try:
+        quantity = int(body.get("quantity", 1))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("'quantity' must be a whole number")
+    return {
+        "name": name.strip(),
+        "category": category,
+        "quantity": max(1, quantity),
+        "save": bool(body.get("save", True)),
+    }
+
+PARSERS = {"pair": parse_pair, "produce": parse_produce}
+
+def job_id_for(kind, body, raw, header=None):
+    # Client-chosen ids (body "job_id" or an Idempotency-Key header) make
+    # retries safe; without one the id is derived from the request and the
+    # date, so the same request sent twice in a day maps to the same job
+    # (produce expiry dates are relative to the day).
+    job_id = body.get("job_id") or header
+    if job_id is None:
+        digest = hashlib.sha256(raw + datetime.now().strftime("%Y-%m-%d").encode()).hexdigest()
+        return f"{kind}-{digest[:24]}"
+    job_id = str(job_id)
+    if not JOB_ID.match(job_id):
+        raise ValueError("job ids are 1-128 characters of letters, digits and . _ : -")
+    return job_id
+
+def filter_inventory(inventory, category=None, search=None):
+    search = (search or "").strip().lower()
+    return {
+        name: details for name, details in inventory.items()
+        if (not category or details.get("category") == category)
+        and (not search or search in name.lower())
+    }
+
+
+def make_handler(jobs):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            logger.info("%s %s", self.address_string(), format % args)
+
+        def send_json(self, status, data, headers=None):
+            payload = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def send_text(self, status, text):
+            payload = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            if url.path == "/health":
+                self.send_json(200, dict(jobs.stats(), status="ok"))
+            elif url.path == "/metrics":
+                self.send_text(200, get_registry().export_prometheus())
+            elif url.path == "/inventory":
+                items = filter_inventory(load_inventory(), query.get("category"), query.get("search"))
+                self.send_json(200, {"items": items})
+            elif url.path.startswith("/jobs/"):
+                job = jobs.get(url.path[len("/jobs/"):])
+                if job is None:
+                    self.send_json(404, {"error": "unknown job"})
+                else:
+                    self.send_json(200, job)
+            else:
+                self.send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            kind = urlparse(self.path).path[len("/jobs/"):] if self.path.startswith("/jobs/") else None
+            if kind not in PARSERS:
+                self.send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                if length < 0:
+                    raise ValueError()
+            except ValueError:
+                # The body cannot be skipped reliably, so the connection is
+                # closed after answering.
+                self.send_json(400, {"error": "invalid Content-Length"})
+                self.close_connection = True
+                return
+            if length > MAX_BODY_BYTES:
+                self.send_json(413, {"error": f"body larger than {MAX_BODY_BYTES} bytes"})
+                self.close_connection = True
+                return
+            raw = self.rfile.read(length)
+            try:
+                body = json.loads(raw or b"{}")
+                if not isinstance(body, dict):
+                    raise ValueError("expected a JSON object")
+                job_id = job_id_for(kind, body, raw, self.headers.get("Idempotency-Key"))
+                # Known ids are answered before the (costly) image decode;
+                # failed jobs are submitted again.
+                job = jobs.get(job_id)
+                if job is None or job["status"] == "failed":
+                    job, created = jobs.submit(job_id, kind, PARSERS[kind](body))
+                else:
+                    created = False
+            except QueueFull:
+                self.send_json(429, {"error": "ingest queue is full"}, {"Retry-After": str(RETRY_AFTER)})
+                return
+            except (ValueError, KeyError) as e:
+                self.send_json(400, {"error": str(e)})
+                return
+            self.send_json(202 if created else 200, job, {"Location": f"/jobs/{job['id']}"})
+
+    return Handler
+
+
+def create_server(host="127.0.0.1", port=8600, workers=DEFAULT_WORKERS, queue_size=QUEUE_SIZE):
+    jobs = JobQueue(RUNNERS, workers, queue_size).start()
+    server = ThreadingHTTPServer((host, port), make_handler(jobs))
+    server.daemon_threads = True
+    server.jobs = jobs
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the ingestion pipeline over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help="Jobs processed at once")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help="Jobs waiting before new ones are refused with 429")
+    parser.add_argument("--no-warm-up", action="store_true", help="Do not preload the model on startup")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    limit_tesseract_threads()
+    if not args.no_warm_up:
+        warm_up(WARMUP_SYSTEM_PROMPTS + (SHELF_LIFE_SYSTEM,))
+    server = create_server(args.host, args.port, args.workers, args.queue_size)
+    host, port = server.server_address[:2]
+    print(f"Ingest service on http://{host}:{port} ({args.workers} workers)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.jobs.stop(timeout=5)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
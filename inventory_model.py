@@ -0,0 +1,179 @@
+import re
+import sys
+from datetime import datetime
+from expiry_index import EXPIRY_FORMAT, ExpiryIndex, days_until, expiry_ordinal
+
+# Canonical units: grams, millilitres and countable units. Each spelling
+# maps to (canonical unit, factor).
+UNIT_ALIASES = {
+    "mg": ("g", 0.001), "g": ("g", 1), "gr": ("g", 1), "gram": ("g", 1), "grams": ("g", 1),
+    "gramm": ("g", 1), "kg": ("g", 1000), "kilo": ("g", 1000), "kilogram": ("g", 1000),
+    "lb": ("g", 453.592), "lbs": ("g", 453.592), "oz": ("g", 28.3495),
+    "ml": ("ml", 1), "cl": ("ml", 10), "dl": ("ml", 100), "l": ("ml", 1000), "ltr": ("ml", 1000),
+    "liter": ("ml", 1000), "litre": ("ml", 1000), "liters": ("ml", 1000), "litres": ("ml", 1000),
+}
+UNIT = "unit"
+
+_QUANTITY = re.compile(r'(\d+(?:[.,]\d+)?)\s*([^\W\d_]+)?')
+
+
+def parse_quantity(text):
+    # "1.5l" -> (1500.0, "ml"), "500 g" -> (500.0, "g"), "2 units" -> (2.0, "unit").
+    # Numbers without a known weight/volume unit count as units; text
+    # without a number gives (None, None).
+    if not text or text == "Unknown":
+        return None, None
+    match = _QUANTITY.search(str(text))
+    if not match:
+        return None, None
+    value = float(match.group(1).replace(",", "."))
+    unit, factor = UNIT_ALIASES.get((match.group(2) or "").lower(), (UNIT, 1))
+    return value * factor, unit
+
+def format_amount(amount, unit):
+    if unit == "g" and amount >= 1000:
+        return f"{amount / 1000:g} kg"
+    if unit == "ml" and amount >= 1000:
+        return f"{amount / 1000:g} l"
+    if unit == UNIT:
+        return f"{amount:g} units"
+    return f"{amount:g} {unit}"
+
+def _date_text(ordinal):
+    return datetime.fromordinal(ordinal).strftime(EXPIRY_FORMAT)
+
+
+class InventoryItem:
+    # One inventory entry, parsed once when it is written. Dates are day
+    # ordinals and the quantity is kept both as entered (for display) and
+    # as amount + canonical unit (for depletion checks and totals). Fields
+    # the model does not know, and dates that do not parse, are kept in
+    # extra so to_dict() returns the stored JSON unchanged.
+
+    __slots__ = ("name", "category", "quantity", "amount", "unit",
+                 "expiry_ordinal", "added_ordinal", "extra")
+
+    def __init__(self, name, category="Unknown", quantity="Unknown", expiry_ordinal=None,
+                 added_ordinal=None, extra=None):
+        self.name = name
+        # Categories repeat across items; share one string per category.
+        self.category = sys.intern(category) if isinstance(category, str) else category
+        self.quantity = quantity
+        self.amount, self.unit = parse_quantity(quantity)
+        self.expiry_ordinal = expiry_ordinal
+        self.added_ordinal = added_ordinal
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, name, details):
+        details = dict(details)
+        category = details.pop("category", "Unknown")
+        quantity = details.pop("quantity", "Unknown")
+        expiry = expiry_ordinal(details.get("expiry"))
+        if expiry is not None:
+            del details["expiry"]
+        added = expiry_ordinal(details.get("added_date"))
+        if added is not None:
+            del details["added_date"]
+        return cls(name, category, quantity, expiry, added, details or None)
+
+    def to_dict(self):
+        data = {"category": self.category, "quantity": self.quantity}
+        extra = self.extra or {}
+        if self.expiry_ordinal is not None:
+            data["expiry"] = _date_text(self.expiry_ordinal)
+        elif "expiry" in extra:
+            data["expiry"] = extra["expiry"]
+        if self.added_ordinal is not None:
+            data["added_date"] = _date_text(self.added_ordinal)
+        elif "added_date" in extra:
+            data["added_date"] = extra["added_date"]
+        for key, value in extra.items():
+            data.setdefault(key, value)
+        return data
+
+    @property
+    def expiry(self):
+        if self.expiry_ordinal is not None:
+            return _date_text(self.expiry_ordinal)
+        return (self.extra or {}).get("expiry", "Unknown")
+
+    @property
+    def depleted(self):
+        return self.amount is not None and self.amount <= 0
+
+    def days_left(self, now=None):
+        if self.expiry_ordinal is None:
+            return None
+        return days_until(self.expiry_ordinal, now)
+
+
+class Inventory:
+    # Name -> InventoryItem, with aggregate queries over the parsed fields.
+    # The app keeps only this per session: index (an ExpiryIndex fed the
+    # already parsed dates) and to_dict() are derived from the items.
+
+    def __init__(self, items=None):
+        self._items = {}
+        self.index = ExpiryIndex()
+        for item in items or ():
+            self._add(item)
+
+    def _add(self, item):
+        self._items[item.name] = item
+        self.index.put(item.name, item.expiry_ordinal)
+
+    @classmethod
+    def from_dict(cls, inventory):
+        return cls(InventoryItem.from_dict(name, details) for name, details in inventory.items())
+
+    def to_dict(self):
+        return {name: item.to_dict() for name, item in self._items.items()}
+
+    def set(self, name, details):
+        item = InventoryItem.from_dict(name, details)
+        self._add(item)
+        return item
+
+    def remove(self, name):
+        self._items.pop(name, None)
+        self.index.remove(name)
+
+    def get(self, name):
+        return self._items.get(name)
+
+    def names(self):
+        return list(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __contains__(self, name):
+        return name in self._items
+
+    def _matching(self, category=None, search=None):
+        search = (search or "").strip().lower()
+        for item in self._items.values():
+            if category and item.category != category:
+                continue
+            if search and search not in item.name.lower():
+                continue
+            yield item
+
+    def totals(self, category=None, search=None):
+        # {"g": ..., "ml": ..., "unit": ...} over the matching items, e.g.
+        # totals(search="rice")["g"] for the grams of rice in stock.
+        totals = {}
+        for item in self._matching(category, search):
+            if item.amount is not None:
+                totals[item.unit] = totals.get(item.unit, 0.0) + item.amount
+        return totals
+
+    def total(self, unit, category=None, search=None):
+        return self.totals(category, search).get(unit, 0.0)
+
+    def at_zero(self, category=None):
+        return [item.name for item in self._matching(category) if item.depleted]
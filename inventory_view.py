@@ -0,0 +1,126 @@
+from datetime import datetime
+from inventory_model import format_amount
+
+SORT_OPTIONS = ("Urgency", "Name", "Category")
+ALL_CATEGORIES = "All"
+
+def _urgency(days_left, depleted):
+    # (badge, label) as View Inventory has always shown them.
+    if depleted:
+        return "🔴", "Unknown"
+    if days_left is None:
+        return "🔵", "Unknown"
+    if days_left < 0:
+        return "🔴", f"EXPIRED ({abs(days_left)} days ago)"
+    if days_left < 3:
+        return "🔴", f"{days_left} days"
+    if days_left < 7:
+        return "🟠", f"{days_left} days"
+    if days_left < 30:
+        return "🟡", f"{days_left} days"
+    return "🟢", f"{days_left} days"
+
+def build_row(item, now):
+    # item is an inventory_model.InventoryItem, so nothing is parsed here.
+    name = item.name
+    days_left = item.days_left(now)
+    depleted = item.depleted
+    badge, days_label = _urgency(days_left, depleted)
+    return {
+        "name": name,
+        "category": item.category,
+        "quantity": item.quantity,
+        "amount": item.amount,
+        "unit": item.unit,
+        "expiry": item.expiry or "Unknown",
+        "days_left": days_left,
+        "depleted": depleted,
+        "badge": badge,
+        "days_label": days_label,
+        # Depleted items first, then soonest expiry; undated items last.
+        "urgency_key": (not depleted, days_left is None, days_left or 0, name.lower()),
+    }
+
+def _totals(rows):
+    amounts = {}
+    at_zero = 0
+    for row in rows:
+        if row["amount"] is not None:
+            amounts[row["unit"]] = amounts.get(row["unit"], 0.0) + row["amount"]
+        at_zero += row["depleted"]
+    parts = [format_amount(amounts[unit], unit) for unit in sorted(amounts)]
+    if at_zero:
+        parts.append(f"{at_zero} at zero")
+    return parts
+
+
+class InventoryView:
+    # Everything View Inventory displays, computed once per inventory change
+    # (and per day, since days-left counts move at midnight). Filtering,
+    # sorting and paging then only touch the precomputed rows, and the page
+    # renders page_size items no matter how large the inventory is.
+
+    def __init__(self, inventory, now=None):
+        now = now or datetime.now()
+        self.day = now.date()
+        self.rows = [build_row(item, now) for item in inventory]
+        self.categories = sorted({row["category"] for row in self.rows})
+        self._sorted = {}
+        self._filtered = (None, None)
+
+    def _sorted_rows(self, sort):
+        # Each sort order is computed at most once per view.
+        rows = self._sorted.get(sort)
+        if rows is None:
+            if sort == "Name":
+                key = lambda row: row["name"].lower()
+            elif sort == "Category":
+                key = lambda row: (row["category"].lower(), row["urgency_key"])
+            else:
+                key = lambda row: row["urgency_key"]
+            rows = self._sorted[sort] = sorted(self.rows, key=key)
+        return rows
+
+    def filter(self, category=ALL_CATEGORIES, search="", sort="Urgency"):
+        # The last filter is kept, with its totals, so paging through it
+        # costs a slice and reruns do not touch the rows at all.
+        return self._filter(category, search, sort)[0]
+
+    def _filter(self, category, search, sort):
+        search = (search or "").strip().lower()
+        key = (category, search, sort)
+        if self._filtered[0] == key:
+            return self._filtered[1]
+        rows = self._sorted_rows(sort)
+        if category and category != ALL_CATEGORIES:
+            rows = [row for row in rows if row["category"] == category]
+        if search:
+            rows = [row for row in rows if search in row["name"].lower()]
+        self._filtered = (key, (rows, _totals(rows)))
+        return self._filtered[1]
+
+    def query(self, category=ALL_CATEGORIES, search="", sort="Urgency", page=1, page_size=25):
+        # Returns (rows on the page, number of matching rows).
+        rows = self.filter(category, search, sort)
+        start = max(0, (page - 1) * page_size)
+        return rows[start:start + page_size], len(rows)
+
+    def totals(self, category=ALL_CATEGORIES, search="", sort="Urgency"):
+        # Stock of the filtered items per canonical unit, plus how many are
+        # at zero, as display strings.
+        return self._filter(category, search, sort)[1]
+
+def get_view(cache, inventory, version, now=None):
+    # inventory is an inventory_model.Inventory; cache is any dict (the
+    # Streamlit session state in the app). The view is rebuilt only when
+    # version, bumped on every add/delete, or the day changes.
+    now = now or datetime.now()
+    view = cache.get("inventory_view")
+    if view is None or cache.get("inventory_view_version") != version or view.day != now.date():
+        view = InventoryView(inventory, now)
+        cache["inventory_view"] = view
+        cache["inventory_view_version"] = version
+    return view
+
+def page_count(total, page_size):
+    return max(1, (total + page_size - 1) // page_size)
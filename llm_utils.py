@@ -1,37 +1,386 @@
 import requests
 import json
-import re
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from llm_cache import LLMCache, make_cache_key
+from metrics import record_llm_usage, span
 
-def ask_llm(prompt):
-    try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": "llama3",
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.1,
-                    "top_p": 0.9
-                }
-            },
-            timeout=60
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
+MODEL = "llama3"
+DEFAULT_OPTIONS = {
+    "temperature": 0.1,
+    "top_p": 0.9
+}
+REQUEST_TIMEOUT = 60
+POOL_CONNECTIONS = 2
+POOL_MAXSIZE = 8
+MAX_CONCURRENCY = 4
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# How long Ollama keeps llama3 loaded after the last request. Its default of
+# five minutes means the first call after a short break pays the full model
+# load, which can exceed REQUEST_TIMEOUT.
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+WARMUP_TIMEOUT = 300
+
+_cache = None
+_session = None
+_session_lock = threading.Lock()
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+
+def get_llm_cache():
+    global _cache
+    if _cache is None:
+        _cache = LLMCache()
+    return _cache
+
+def set_llm_cache(cache):
+    global _cache
+    _cache = cache
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _create_session(POOL_CONNECTIONS, POOL_MAXSIZE)
+        return _session
+
+def configure_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE):
+    global _session
+    with _session_lock:
+        old_session = _session
+        _session = _create_session(pool_connections, pool_maxsize)
+    if old_session is not None:
+        old_session.close()
+    return _session
+
+def _create_session(pool_connections, pool_maxsize):
+    # One keep-alive session shared by every call so requests reuse open
+    # connections to Ollama instead of paying TCP setup each time.
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _generation_options(num_predict=None, stop=None):
+    options = dict(DEFAULT_OPTIONS)
+    if num_predict is not None:
+        options["num_predict"] = num_predict
+    if stop:
+        options["stop"] = list(stop)
+    return options
+
+def _build_payload(prompt, stream, options=None, format=None, system=None):
+    payload = {
+        "model": MODEL,
+        "prompt": prompt,
+        "stream": stream,
+        "options": options or DEFAULT_OPTIONS,
+        "keep_alive": KEEP_ALIVE
+    }
+    # "json" or a JSON schema dict; Ollama constrains decoding to match it.
+    if format:
+        payload["format"] = format
+    # The system prompt is rendered ahead of the prompt, so a fixed system
+    # prompt gives every request the same token prefix and Ollama reuses
+    # its evaluated state instead of re-reading the instructions.
+    if system:
+        payload["system"] = system
+    return payload
+
+def _cache_key(prompt, options, format, system=None):
+    key_options = dict(options)
+    if format:
+        key_options["format"] = format
+    if system:
+        key_options["system"] = system
+    return make_cache_key(MODEL, prompt, key_options)
+
+def generate(prompt, system=None, format=None, num_predict=None, stop=None, timeout=REQUEST_TIMEOUT):
+    # One non-streaming request returning Ollama's full reply, including the
+    # load/prompt_eval/eval timings. Raises on HTTP and connection errors.
+    response = get_session().post(
+        OLLAMA_URL,
+        json=_build_payload(prompt, stream=False, options=_generation_options(num_predict, stop),
+                            format=format, system=system),
+        timeout=timeout
+    )
+    response.raise_for_status()
+    return response.json()
+
+def warm_up(system_prompts=(), background=True):
+    # Loads the model (and keeps it loaded for KEEP_ALIVE) before the first
+    # real request needs it, then evaluates each fixed system prompt once so
+    # its prefix is already cached. Runs once per process; with background
+    # the work happens on a daemon thread, which is returned.
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is not None:
+            return _warmup_thread
+        _warmup_thread = threading.Thread(
+            target=_warm_up, args=(tuple(system_prompts),), name="llm-warmup", daemon=True
         )
-        result = response.json()
-        return result.get("response", "No response from LLM")
+        _warmup_thread.start()
+    if not background:
+        _warmup_thread.join()
+    return _warmup_thread
+
+def _warm_up(system_prompts):
+    try:
+        # An empty prompt only loads the model.
+        generate("", timeout=WARMUP_TIMEOUT)
+        for system in system_prompts:
+            generate(".", system=system, num_predict=1, timeout=WARMUP_TIMEOUT)
+    except Exception:
+        # Ollama not running yet; the first real request will report it.
+        pass
+
+def _post_with_retries(payload, timeout, retries, backoff, cancel_event):
+    # Returns (result, None) on a decoded reply or (None, error message).
+    attempt = 0
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            return None, "Request cancelled"
+
+        error = None
+        try:
+            response = get_session().post(OLLAMA_URL, json=payload, timeout=timeout)
+            if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+                error = f"Error: HTTP {response.status_code}"
+            else:
+                return response.json(), None
+        except requests.exceptions.Timeout:
+            error = "Request timed out"
+        except requests.exceptions.ConnectionError as e:
+            error = f"Error: {e}"
+        except Exception as e:
+            return None, f"Error: {e}"
+
+        if attempt >= retries:
+            return None, error
+        delay = backoff * (2 ** attempt)
+        attempt += 1
+        if cancel_event is not None:
+            if cancel_event.wait(delay):
+                return None, "Request cancelled"
+        else:
+            time.sleep(delay)
+
+def ask_llm(prompt, use_cache=False, timeout=REQUEST_TIMEOUT, retries=0, backoff=0.5,
+            cancel_event=None, format=None, num_predict=None, stop=None, system=None):
+    options = _generation_options(num_predict, stop)
+    cache = get_llm_cache() if use_cache else None
+    if cache is not None:
+        key = _cache_key(prompt, options, format, system)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    # Cache hits are not traced; the span covers the request and retries.
+    payload = _build_payload(prompt, stream=False, options=options, format=format, system=system)
+    with span("ask_llm") as labels:
+        result, error = _post_with_retries(payload, timeout, retries, backoff, cancel_event)
+        if error is not None:
+            labels["status"] = "error"
+            return error
+        if "response" not in result:
+            labels["status"] = "error"
+        else:
+            record_llm_usage(result)
+
+    if "response" not in result:
+        # Ollama releases before 0.5 only accept format="json", not schemas.
+        if "error" in result and isinstance(format, dict):
+            return ask_llm(prompt, use_cache, timeout, retries, backoff, cancel_event,
+                           format="json", num_predict=num_predict, stop=stop, system=system)
+        return "No response from LLM"
+
+    # Only successful generations are cached; errors and timeouts are retried.
+    if cache is not None:
+        cache.set(key, result["response"])
+    return result["response"]
+
+def ask_llm_many(prompts, max_concurrency=MAX_CONCURRENCY, use_cache=False,
+                 timeout=REQUEST_TIMEOUT, retries=2, backoff=0.5, cancel_event=None, **kwargs):
+    # Runs the prompts concurrently with at most max_concurrency requests in
+    # flight and returns the responses in the same order as the prompts.
+    # Setting cancel_event stops queued prompts and pending retries. A prompt
+    # may also be a dict of ask_llm keyword arguments ({"prompt": ...,
+    # "format": ..., "num_predict": ...}) overriding the shared kwargs.
+    prompts = list(prompts)
+    if not prompts:
+        return []
+    if cancel_event is None:
+        cancel_event = threading.Event()
+
+    requests_kwargs = []
+    for prompt in prompts:
+        call = dict(kwargs, use_cache=use_cache, timeout=timeout, retries=retries,
+                    backoff=backoff, cancel_event=cancel_event)
+        if isinstance(prompt, dict):
+            call.update(prompt)
+        else:
+            call["prompt"] = prompt
+        requests_kwargs.append(call)
+
+    results = [None] * len(prompts)
+    workers = max(1, min(max_concurrency, len(prompts)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(ask_llm, **call): index
+            for index, call in enumerate(requests_kwargs)
+        }
+        try:
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        except BaseException:
+            cancel_event.set()
+            for future in futures:
+                future.cancel()
+            raise
+    return results
+
+def stream_llm(prompt, use_cache=False, format=None, num_predict=None, stop=None, system=None):
+    options = _generation_options(num_predict, stop)
+    cache = get_llm_cache() if use_cache else None
+    if cache is not None:
+        key = _cache_key(prompt, options, format, system)
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    tokens = []
+    try:
+        with span("stream_llm"), get_session().post(
+            OLLAMA_URL,
+            json=_build_payload(prompt, stream=True, options=options, format=format, system=system),
+            stream=True,
+            timeout=REQUEST_TIMEOUT
+        ) as response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    yield f"Error: {chunk['error']}"
+                    return
+                token = chunk.get("response", "")
+                if token:
+                    tokens.append(token)
+                    yield token
+                if chunk.get("done"):
+                    record_llm_usage(chunk)
+                    break
     except requests.exceptions.Timeout:
-        return "Request timed out"
+        yield "Request timed out"
+        return
     except Exception as e:
-        return f"Error: {e}"
+        yield f"Error: {e}"
+        return
+
+    if not tokens:
+        yield "No response from LLM"
+        return
+
+    if cache is not None:
+        cache.set(key, "".join(tokens))
+
+def ask_llm_json(prompt, schema=None, num_predict=None, stop=None, use_cache=False, stream=False,
+                 system=None):
+    # Constrained JSON generation returning the parsed object ({} on
+    # failure). With stream=True the generation is abandoned as soon as the
+    # first complete object has arrived, so trailing chatter costs nothing.
+    format = schema or "json"
+    if not stream:
+        return safe_json_parse(ask_llm(prompt, use_cache=use_cache, format=format,
+                                       num_predict=num_predict, stop=stop, system=system))
+
+    parser = JSONStreamParser()
+    tokens = stream_llm(prompt, use_cache=use_cache, format=format, num_predict=num_predict,
+                        stop=stop, system=system)
+    try:
+        for token in tokens:
+            values = parser.feed(token)
+            if values:
+                return values[0]
+    finally:
+        tokens.close()
+    return {}
+
+
+class JSONStreamParser:
+    # Incrementally finds complete top-level JSON objects in text that may
+    # contain prose around them. Tracks nesting and string state across
+    # chunks, so nested objects and braces inside strings are handled, and
+    # a candidate that fails to decode is skipped without losing any object
+    # that starts inside it.
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._reset()
+
+    def _reset(self):
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk):
+        self._text += chunk
+        text = self._text
+        values = []
+        i = self._pos
+        while i < len(text):
+            c = text[i]
+            if self._start is None:
+                if c == '{':
+                    self._start = i
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in '{[':
+                self._depth += 1
+            elif c in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    start = self._start
+                    self._reset()
+                    try:
+                        values.append(json.loads(text[start:i + 1]))
+                    except ValueError:
+                        i = start
+            i += 1
+
+        # Drop text that can no longer be part of an object.
+        keep_from = self._start if self._start is not None else i
+        self._text = text[keep_from:]
+        self._pos = i - keep_from
+        if self._start is not None:
+            self._start -= keep_from
+        return values
+
+def extract_json(text):
+    values = JSONStreamParser().feed(text)
+    return values[0] if values else None
 
 def safe_json_parse(s):
     try:
         return json.loads(s)
     except:
-        match = re.search(r'\{[^{}]*\}', s)
-        if match:
-            try:
-                return json.loads(match.group(0))
-            except:
-                pass
-    return {}
\ No newline at end of file
+        value = extract_json(s or "")
+        if value is not None:
+            return value
+    return {}
@@ -0,0 +1,286 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+METRIC_PREFIX = "smartshelf"
+# Upper bounds in seconds; wide enough for sub-millisecond regex parses and
+# a cold model load alike.
+DURATION_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 40, 60, 80, 120, 200)
+RECENT_SPANS = 200
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+class Histogram:
+    # Cumulative-bucket histogram in the Prometheus sense, plus min/max.
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        # Linear interpolation inside the bucket holding the q-th value,
+        # clamped to the observed range.
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = self.min
+        for index, count in enumerate(self.counts):
+            upper = self.buckets[index] if index < len(self.buckets) else self.max
+            upper = min(upper, self.max)
+            if count and seen + count >= rank:
+                value = lower + (upper - lower) * (rank - seen) / count
+                return min(max(value, self.min), self.max)
+            seen += count
+            lower = max(upper, self.min)
+        return self.max
+
+    def merge(self, data):
+        if tuple(data["buckets"]) != self.buckets:
+            raise ValueError("Bucket layouts differ")
+        self.counts = [a + b for a, b in zip(self.counts, data["counts"])]
+        self.count += data["count"]
+        self.sum += data["sum"]
+        for attr, pick in (("min", min), ("max", max)):
+            other = data[attr]
+            if other is not None:
+                mine = getattr(self, attr)
+                setattr(self, attr, other if mine is None else pick(mine, other))
+
+    def to_dict(self):
+        return {
+            "buckets": list(self.buckets),
+            "counts": list(self.counts),
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+        }
+
+
+class MetricsRegistry:
+    # Histograms and counters keyed by (name, sorted label items). Everything
+    # lives in memory; exports are snapshots.
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._recent = deque(maxlen=RECENT_SPANS)
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, labels=None, buckets=DURATION_BUCKETS):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, value=1, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def record_span(self, name, duration, labels):
+        labels = {key: str(value) for key, value in labels.items()}
+        self.observe("span_duration_seconds", duration, dict(labels, span=name))
+        with self._lock:
+            self._recent.append({"time": time.time(), "span": name,
+                                 "labels": labels, "seconds": duration})
+
+    def recent_spans(self):
+        with self._lock:
+            return list(self._recent)
+
+    def snapshot(self, reset=False):
+        with self._lock:
+            data = {
+                "histograms": [
+                    {"name": name, "labels": dict(labels), **histogram.to_dict()}
+                    for (name, labels), histogram in sorted(self._histograms.items())
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+            }
+            if reset:
+                self._histograms.clear()
+                self._counters.clear()
+                self._recent.clear()
+        return data
+
+    def merge(self, snapshot):
+        # Folds in a snapshot from another process (see ingest_cli).
+        with self._lock:
+            for entry in snapshot.get("histograms", []):
+                key = (entry["name"], tuple(sorted(entry["labels"].items())))
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(entry["buckets"])
+                histogram.merge(entry)
+            for entry in snapshot.get("counters", []):
+                key = (entry["name"], tuple(sorted(entry["labels"].items())))
+                self._counters[key] = self._counters.get(key, 0) + entry["value"]
+
+    def reset(self):
+        self.snapshot(reset=True)
+
+    def summary(self):
+        # One row per histogram with count, mean and estimated p50/p95, for
+        # reports and the debug panel.
+        rows = []
+        with self._lock:
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if not histogram.count:
+                    continue
+                rows.append({
+                    "metric": name,
+                    **dict(labels),
+                    "count": histogram.count,
+                    "mean": histogram.sum / histogram.count,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "max": histogram.max,
+                })
+        return rows
+
+    def export_json(self):
+        data = self.snapshot()
+        data["summary"] = self.summary()
+        return json.dumps(data, indent=2)
+
+    def export_prometheus(self):
+        lines = []
+        with self._lock:
+            families = {}
+            for (name, labels), histogram in self._histograms.items():
+                families.setdefault(name, []).append((labels, histogram))
+            for name in sorted(families):
+                metric = f"{METRIC_PREFIX}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for labels, histogram in sorted(families[name], key=lambda entry: entry[0]):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        le = bound if bound == "+Inf" else repr(float(bound))
+                        lines.append(f"{metric}_bucket{_labels(labels, le=le)} {cumulative}")
+                    lines.append(f"{metric}_sum{_labels(labels)} {histogram.sum}")
+                    lines.append(f"{metric}_count{_labels(labels)} {histogram.count}")
+
+            counters = {}
+            for (name, labels), value in self._counters.items():
+                counters.setdefault(name, []).append((labels, value))
+            for name in sorted(counters):
+                metric = f"{METRIC_PREFIX}_{name}"
+                lines.append(f"# TYPE {metric} counter")
+                for labels, value in sorted(counters[name]):
+                    lines.append(f"{metric}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    escaped = []
+    for key, value in items:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+        return _registry
+
+def set_registry(registry):
+    global _registry
+    with _registry_lock:
+        _registry = registry
+
+@contextmanager
+def span(name, **labels):
+    # Times the block into the span_duration_seconds histogram. The yielded
+    # dict can be filled in with labels only known at the end (e.g. whether
+    # the answer came from the cache); failures are labelled status="error".
+    if not METRICS_ENABLED:
+        yield labels
+        return
+    start = time.perf_counter()
+    try:
+        yield labels
+    except GeneratorExit:
+        # A streaming consumer stopped reading early.
+        labels["status"] = "closed"
+        raise
+    except BaseException:
+        labels["status"] = "error"
+        raise
+    finally:
+        get_registry().record_span(name, time.perf_counter() - start, labels)
+
+def traced(name=None):
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def observe(name, value, labels=None, buckets=DURATION_BUCKETS):
+    if METRICS_ENABLED:
+        get_registry().observe(name, value, labels, buckets)
+
+def increment(name, value=1, labels=None):
+    if METRICS_ENABLED:
+        get_registry().increment(name, value, labels)
+
+def record_llm_usage(result):
+    # Ollama reports eval_count tokens generated in eval_duration ns, and
+    # the same for the prompt; both arrive on the final (done) message.
+    eval_count = result.get("eval_count")
+    eval_duration = result.get("eval_duration")
+    if eval_count:
+        increment("llm_eval_tokens_total", eval_count)
+        if eval_duration:
+            observe("llm_tokens_per_second", eval_count / (eval_duration / 1e9),
+                    buckets=TOKENS_PER_SECOND_BUCKETS)
+    prompt_count = result.get("prompt_eval_count")
+    if prompt_count:
+        increment("llm_prompt_eval_tokens_total", prompt_count)
+    prompt_duration = result.get("prompt_eval_duration")
+    if prompt_duration:
+        observe("llm_prompt_eval_seconds", prompt_duration / 1e9)
+    load_duration = result.get("load_duration")
+    if load_duration:
+        observe("llm_load_seconds", load_duration / 1e9)
@@ -0,0 +1,210 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+OCR_CACHE_FILE = os.path.join(".cache", "ocr_cache.sqlite")
+HASH_SIZE = 16
+# Hamming-distance tolerance per preprocessing mode, out of HASH_SIZE**2
+# bits. A 16x16 dHash does not see a changed digit at all ("05.2026" and
+# "06.2026" hash the same), so modes not listed here, expiry included, are
+# keyed on the exact pixel content instead.
+MAX_DISTANCE = {"product": 3}
+# Perceptual hits are only trusted when a DETAIL_SIZE greyscale thumbnail
+# of the image is within DETAIL_TOLERANCE grey levels of the stored one at
+# every pixel. Noise and JPEG re-encoding move it by 1-2 levels, a changed
+# digit ("1kg" vs "5kg") by 20 or more.
+DETAIL_SIZE = (128, 96)
+DETAIL_TOLERANCE = 8
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def dhash(pil_image, hash_size=HASH_SIZE):
+    # Difference hash: one bit per horizontally adjacent pixel pair of a
+    # (hash_size + 1) x hash_size greyscale thumbnail.
+    small = pil_image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR, reducing_gap=2.0)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+def content_hash(pil_image):
+    # Exact match on the decoded pixels.
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{pil_image.mode}:{pil_image.size}".encode())
+    digest.update(pil_image.tobytes())
+    return int.from_bytes(digest.digest(), "big")
+
+def detail_thumbnail(pil_image, size=DETAIL_SIZE):
+    return pil_image.convert("L").resize(size, Image.BOX).tobytes()
+
+def details_match(a, b, tolerance=DETAIL_TOLERANCE):
+    if a is None or b is None or len(a) != len(b):
+        return False
+    diff = np.abs(np.frombuffer(a, np.uint8).astype(np.int16) - np.frombuffer(b, np.uint8))
+    return int(diff.max()) <= tolerance
+
+
+class OCRCache:
+    # LRU map of (mode, hash) -> (OCR text, detail thumbnail). For modes
+    # with a Hamming tolerance the hash is perceptual and lookups try stored
+    # hashes within it, closest first, accepting the first whose thumbnail
+    # also matches; a re-upload or a re-encoded copy of the same label then
+    # skips preprocessing and Tesseract. Other modes match exact pixels.
+    # With a path, entries are also kept in a SQLite table, one row each,
+    # so inserts do not rewrite the whole cache and ingest_cli worker
+    # processes share it instead of overwriting each other.
+
+    def __init__(self, max_items=512, max_distance=None, path=None):
+        self.max_items = max_items
+        self.max_distance = dict(MAX_DISTANCE)
+        if max_distance is not None:
+            self.max_distance.update(max_distance)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "mode TEXT NOT NULL, hash TEXT NOT NULL, text TEXT NOT NULL, "
+                "detail BLOB, accessed REAL NOT NULL, PRIMARY KEY (mode, hash))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)"
+            )
+            self._conn.commit()
+            self._load()
+
+    def _load(self):
+        # The most recently used rows, oldest first so the LRU order holds.
+        rows = self._conn.execute(
+            "SELECT mode, hash, text, detail FROM entries ORDER BY accessed DESC LIMIT ?",
+            (self.max_items,)
+        ).fetchall()
+        for mode, hash_hex, text, detail in reversed(rows):
+            self._entries[(mode, int(hash_hex, 16))] = (text, detail)
+
+    def _lookup(self, key):
+        # Exact keys another process stored after this one loaded.
+        mode, value = key
+        row = self._conn.execute(
+            "SELECT text, detail FROM entries WHERE mode = ? AND hash = ?",
+            (mode, format(value, "x"))
+        ).fetchone()
+        if row is not None:
+            self._remember(key, tuple(row))
+        return row is not None
+
+    def _touch(self, key):
+        self._conn.execute(
+            "UPDATE entries SET accessed = ? WHERE mode = ? AND hash = ?",
+            (time.time(), key[0], format(key[1], "x"))
+        )
+        self._conn.commit()
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_items:
+            self._entries.popitem(last=False)
+
+    def key(self, pil_image, mode):
+        # (hash, detail thumbnail or None) to pass to get() and set().
+        if self.max_distance.get(mode, 0) > 0:
+            return dhash(pil_image), detail_thumbnail(pil_image)
+        return content_hash(pil_image), None
+
+    def get(self, image_hash, mode, detail=None):
+        with self._lock:
+            tolerance = self.max_distance.get(mode, 0)
+            if tolerance > 0:
+                candidates = sorted(
+                    (hamming(value, image_hash), (entry_mode, value))
+                    for entry_mode, value in self._entries if entry_mode == mode
+                )
+                keys = [key for distance, key in candidates
+                        if distance <= tolerance and details_match(self._entries[key][1], detail)]
+            else:
+                key = (mode, image_hash)
+                found = key in self._entries or (self._conn is not None and self._lookup(key))
+                keys = [key] if found else []
+            if not keys:
+                self.misses += 1
+                return None
+            key = keys[0]
+            self._entries.move_to_end(key)
+            if self._conn is not None:
+                self._touch(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def set(self, image_hash, mode, text, detail=None):
+        with self._lock:
+            self._remember((mode, image_hash), (text, detail))
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (mode, hash, text, detail, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (mode, format(image_hash, "x"), text, detail, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        overflow = count - self.max_items
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM entries WHERE rowid IN ("
+                "SELECT rowid FROM entries ORDER BY accessed ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM entries")
+                self._conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "items": len(self._entries),
+        }
+
+
+def get_ocr_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OCRCache(path=OCR_CACHE_FILE)
+        return _cache
+
+def set_ocr_cache(cache):
+    global _cache
+    with _cache_lock:
+        _cache = cache
@@ -0,0 +1,154 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from metrics import span
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+OCR_LANG = "eng"
+POOL_QUEUE_SIZE = 16
+SUBMIT_TIMEOUT = 0.5
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_failed = False
+_pool_lock = threading.Lock()
+
+
+def psm_from_config(config):
+    parts = config.split()
+    if "--psm" in parts:
+        return int(parts[parts.index("--psm") + 1])
+    return 3
+
+
+class TesseractPool:
+    # Long-lived OCR workers. Each worker thread owns one tesserocr API
+    # instance, so the engine and traineddata are loaded once and images are
+    # handed over in memory instead of through temp files and a new
+    # tesseract process per call. tesserocr releases the GIL while
+    # recognising, so the workers run in parallel.
+
+    def __init__(self, workers=None, lang=OCR_LANG, queue_size=POOL_QUEUE_SIZE,
+                 submit_timeout=SUBMIT_TIMEOUT):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        self.lang = lang
+        self.submit_timeout = submit_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._closed = False
+        self._error = None
+        self._lock = threading.Lock()
+        # Engines are loaded here rather than in the workers, so a missing
+        # traineddata or a bad TESSDATA_PREFIX fails the constructor instead
+        # of leaving a pool whose jobs are never picked up.
+        apis = []
+        try:
+            for _ in range(workers or os.cpu_count() or 1):
+                apis.append(tesserocr.PyTessBaseAPI(lang=lang))
+        except Exception:
+            for api in apis:
+                api.End()
+            raise
+        self._alive = len(apis)
+        for i, api in enumerate(apis):
+            thread = threading.Thread(target=self._worker, args=(api,), name=f"tesseract-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self, api):
+        error = None
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    break
+                future, pil_image, config = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with span("ocr_config", config=config, engine="tesserocr"):
+                        api.SetPageSegMode(psm_from_config(config))
+                        api.SetImage(pil_image)
+                        text = api.GetUTF8Text()
+                        confidences = [c for c in api.AllWordConfidences() if c >= 0]
+                    mean_conf = sum(confidences) / len(confidences) if confidences else 0.0
+                    future.set_result((text.strip(), float(mean_conf)))
+                except Exception as e:
+                    future.set_exception(e)
+                finally:
+                    api.Clear()
+        except Exception as e:
+            error = e
+        finally:
+            api.End()
+            self._exited(error)
+
+    def _exited(self, error):
+        # The last worker to go down fails whatever is still queued, so no
+        # caller waits on a future nobody will resolve.
+        with self._lock:
+            self._alive -= 1
+            if self._alive or self._closed:
+                return
+            self._error = error or RuntimeError("OCR pool workers exited")
+        self._fail_queued()
+
+    def _fail_queued(self):
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None and job[0].set_running_or_notify_cancel():
+                job[0].set_exception(RuntimeError(f"OCR pool is down: {self._error}"))
+
+    def submit(self, pil_image, config):
+        # Raises queue.Full when the queue stays full for submit_timeout so
+        # callers can fall back to running OCR inline during bursts, and
+        # RuntimeError once the pool is closed or its workers are gone.
+        if self._closed:
+            raise RuntimeError("OCR pool is closed")
+        if self._error is not None:
+            raise RuntimeError(f"OCR pool is down: {self._error}")
+        future = Future()
+        self._queue.put((future, pil_image, config), timeout=self.submit_timeout)
+        if self._error is not None:
+            self._fail_queued()
+        return future
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+
+def get_ocr_pool():
+    # Returns the shared pool, or None when tesserocr is unavailable, its
+    # engine cannot be loaded, or the pool is disabled with
+    # OCR_POOL_WORKERS=0. A failed start is not retried.
+    global _pool, _pool_failed
+    with _pool_lock:
+        if _pool is None and not _pool_failed and tesserocr is not None:
+            workers = int(os.environ.get("OCR_POOL_WORKERS", os.cpu_count() or 1))
+            if workers > 0:
+                try:
+                    _pool = TesseractPool(workers=workers)
+                except Exception:
+                    logger.exception("Could not start the tesserocr pool; using pytesseract")
+                    _pool_failed = True
+                    return None
+                atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,78 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pipeline import complete_details, read_expiry_label, read_product_label
+
+# Two workers: one upload of each label can be read at the same time.
+PREFETCH_WORKERS = 2
+# Reads kept per process; the oldest are dropped first.
+MAX_PREFETCHED = 32
+
+_READERS = {"product": read_product_label, "expiry": read_expiry_label}
+
+
+def upload_digest(uploads):
+    # Content hash of one uploaded file or a list of them (a burst), so the
+    # same photo uploaded again, or by another session, reuses its read.
+    if not isinstance(uploads, (list, tuple)):
+        uploads = [uploads]
+    digest = hashlib.blake2b(digest_size=16)
+    for upload in uploads:
+        digest.update(upload.getvalue())
+    return digest.hexdigest()
+
+
+class OCRPrefetcher:
+    # Reads labels (barcode lookup, preprocessing, OCR and the local expiry
+    # parse) on background threads as soon as their images arrive. Reads
+    # are keyed by (digest, mode), so Streamlit reruns submit nothing new;
+    # process() collects both reads and leaves only the LLM step.
+
+    def __init__(self, workers=PREFETCH_WORKERS, max_entries=MAX_PREFETCHED):
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr-prefetch")
+        self._reads = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read(mode, images, use_cache):
+        timings = {}
+        return _READERS[mode](images, use_cache=use_cache, timings=timings), timings
+
+    def submit(self, digest, mode, images, use_cache=True):
+        # Returns the future of the read; a read that failed is retried.
+        key = (digest, mode)
+        with self._lock:
+            future = self._reads.get(key)
+            if future is not None and not (future.done() and future.exception() is not None):
+                self._reads.move_to_end(key)
+                return future
+            future = self._executor.submit(self._read, mode, images, use_cache)
+            self._reads[key] = future
+            while len(self._reads) > self.max_entries:
+                _, oldest = self._reads.popitem(last=False)
+                oldest.cancel()
+            return future
+
+    def process(self, product_digest, product_images, expiry_digest, expiry_images,
+                use_cache=True, timings=None):
+        # Same result as pipeline.process_candidates. Reads that were never
+        # submitted (or were dropped) start here; the product prompt goes
+        # out as soon as the product read is in, while the expiry read may
+        # still be running.
+        product_read = self.submit(product_digest, "product", product_images, use_cache)
+        expiry_read = self.submit(expiry_digest, "expiry", expiry_images, use_cache)
+
+        def collect(read):
+            result, stages = read.result()
+            if timings is not None:
+                for stage, seconds in stages.items():
+                    timings[stage] = timings.get(stage, 0.0) + seconds
+            return result
+
+        return complete_details(lambda: collect(product_read), lambda: collect(expiry_read),
+                                use_cache=use_cache, timings=timings)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
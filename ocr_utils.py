@@ -2,114 +2,344 @@ import pytesseract
 from PIL import Image
 import cv2
 import numpy as np
-import re
-import calendar
+import os
+import queue
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from metrics import span, traced
+from ocr_pool import get_ocr_pool
+from ocr_cache import get_ocr_cache
 
-def preprocess_image(pil_image, mode="product"):
-    img = np.array(pil_image)
-    
-    if len(img.shape) == 2:
-        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-    elif img.shape[2] == 4:
-        img = cv2.cvtColor(img, cv2.COLOR_RGBA2BGR)
-    
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    
+# The first config is tried on its own; the others only run for images
+# where it falls short of CONFIDENCE_THRESHOLD.
+OCR_CONFIGS = ['--psm 6', '--psm 3', '--psm 11']
+# Mean word confidence (0-100) at which a PSM result is accepted outright
+# and the remaining page segmentation modes are skipped.
+CONFIDENCE_THRESHOLD = 80
+TESSERACT_OMP_THREADS = "1"
+
+# Text-region detection (see find_text_regions)
+ROI_DETECT_WIDTH = 800
+ROI_MIN_AREA_RATIO = 0.0005
+ROI_MIN_FILL = 0.15
+ROI_PADDING = 0.1
+ROI_MAX_REGIONS = 8
+ROI_MAX_COVERAGE = 0.6
+
+# Images are decoded at no more than this many pixels on the long edge;
+# label text stays well above Tesseract's minimum glyph height.
+MAX_IMAGE_SIDE = 2000
+# Estimated noise (grey-level std) below which denoising is skipped, and
+# the factor mapping the estimate to fastNlMeansDenoising strength.
+NOISE_SKIP_SIGMA = 2.0
+NOISE_STRENGTH_FACTOR = 1.2
+NOISE_WINDOW = 768
+# Product photos shorter than this are upscaled before filtering. Text-region
+# crops are cut from full-resolution photos, so they are only brought up to
+# a minimum line height for Tesseract.
+FULL_FRAME_MIN_HEIGHT = 300
+MIN_CROP_HEIGHT = 40
+NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+SHARPEN_KERNEL = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
+
+_ocr_executor = None
+_ocr_executor_lock = threading.Lock()
+
+def load_image(source, max_side=MAX_IMAGE_SIDE, grayscale=True):
+    # Decodes an upload at no more than ~max_side pixels on the long edge.
+    # JPEGs are decoded directly at a reduced scale (and straight to
+    # luminance) with draft(); other formats are box-reduced right after
+    # decoding, so a 12 MP photo never lives in memory at full size as RGB.
+    img = Image.open(source)
+    longest = max(img.size)
+    if img.format == "JPEG" and longest > max_side:
+        factor = longest / max_side
+        img.draft("L" if grayscale else "RGB",
+                  (int(img.size[0] / factor), int(img.size[1] / factor)))
+    img.load()
+
+    factor = max(img.size) // max_side
+    if factor >= 2:
+        img = img.reduce(factor)
+    if grayscale and img.mode != "L":
+        img = img.convert("L")
+    return img
+
+def _to_gray(pil_image):
+    # One single-channel array owned by the caller, so later steps can
+    # work in place.
+    if pil_image.mode != "L":
+        pil_image = pil_image.convert("L")
+    return np.array(pil_image)
+
+def estimate_noise(gray):
+    # Immerkaer's fast noise estimate: the response of a Laplacian-difference
+    # kernel is ~zero on smooth image content and proportional to sensor
+    # noise elsewhere. Measured on a central window so the float response
+    # stays small. Returns the estimated standard deviation in grey levels.
+    height, width = gray.shape
+    top = max(0, (height - NOISE_WINDOW) // 2)
+    left = max(0, (width - NOISE_WINDOW) // 2)
+    window = gray[top:top + NOISE_WINDOW, left:left + NOISE_WINDOW]
+    height, width = window.shape
+    if height < 3 or width < 3:
+        return 0.0
+    response = cv2.filter2D(window, cv2.CV_32F, NOISE_KERNEL)
+    total = cv2.norm(response[1:-1, 1:-1], cv2.NORM_L1)
+    return total * np.sqrt(0.5 * np.pi) / (6.0 * (width - 2) * (height - 2))
+
+def _denoise(gray, max_strength):
+    # Filter strength follows the measured noise, never exceeding the fixed
+    # strength used before; clean images skip the filter entirely.
+    sigma = estimate_noise(gray)
+    if sigma < NOISE_SKIP_SIGMA:
+        return gray
+    strength = min(max_strength, max(3.0, NOISE_STRENGTH_FACTOR * sigma))
+    return cv2.fastNlMeansDenoising(gray, None, strength, 7, 21)
+
+def _preprocess_gray(gray, mode, min_height=FULL_FRAME_MIN_HEIGHT):
+    with span("preprocess_image", mode=mode):
+        return _filter_gray(gray, mode, min_height)
+
+def _filter_gray(gray, mode, min_height=FULL_FRAME_MIN_HEIGHT):
+    # gray is modified in place where OpenCV allows it.
     if mode == "expiry":
-        gray = cv2.equalizeHist(gray)
-        gray = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
-        _, otsu = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        return Image.fromarray(otsu)
+        cv2.equalizeHist(gray, dst=gray)
+        gray = _denoise(gray, 10)
+        cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=gray)
+        return Image.fromarray(gray)
     else:
         height, width = gray.shape
-        if height < 300:
-            scale = 300 / height
+        if height < min_height:
+            scale = min_height / height
             gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
         
-        gray = cv2.fastNlMeansDenoising(gray, None, 7, 7, 21)
-        kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-        gray = cv2.filter2D(gray, -1, kernel)
-        gray = cv2.convertScaleAbs(gray, alpha=1.5, beta=10)
+        gray = _denoise(gray, 7)
+        cv2.filter2D(gray, -1, SHARPEN_KERNEL, dst=gray)
+        cv2.convertScaleAbs(gray, dst=gray, alpha=1.5, beta=10)
         
         return Image.fromarray(gray)
 
-def extract_text_multiconfig(pil_image):
-    configs = ['--psm 6', '--psm 3', '--psm 11']
-    results = []
-    for config in configs:
+def preprocess_image(pil_image, mode="product"):
+    return _preprocess_gray(_to_gray(pil_image), mode)
+
+def find_text_regions(gray):
+    # Locates likely text / date-stamp blocks with a morphological gradient:
+    # character strokes give dense gradient responses that a wide closing
+    # joins into line and block shapes. Detection runs on a small copy and
+    # the boxes are scaled back to full resolution. Returns (x, y, w, h)
+    # boxes in reading order, or [] when nothing worth cropping was found.
+    height, width = gray.shape
+    scale = min(1.0, ROI_DETECT_WIDTH / width)
+    if scale < 1.0:
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    else:
+        small = gray
+    small_h, small_w = small.shape
+
+    ellipse = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, ellipse)
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    joiner = cv2.getStructuringElement(
+        cv2.MORPH_RECT, (max(9, small_w // 40), max(3, small_h // 100))
+    )
+    blocks = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, joiner)
+    contours, _ = cv2.findContours(blocks, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    min_area = small_w * small_h * ROI_MIN_AREA_RATIO
+    candidates = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w * h < min_area or h < 8 or w < h:
+            continue
+        fill = cv2.countNonZero(binary[y:y + h, x:x + w]) / float(w * h)
+        if fill < ROI_MIN_FILL:
+            continue
+        candidates.append((w * h, x, y, w, h))
+
+    candidates.sort(reverse=True)
+    regions = []
+    covered = 0
+    for _, x, y, w, h in candidates[:ROI_MAX_REGIONS]:
+        pad_x, pad_y = int(w * ROI_PADDING) + 2, int(h * ROI_PADDING) + 2
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(small_w, x + w + pad_x), min(small_h, y + h + pad_y)
+        covered += (x1 - x0) * (y1 - y0)
+        regions.append((
+            int(x0 / scale), int(y0 / scale),
+            int((x1 - x0) / scale), int((y1 - y0) / scale)
+        ))
+
+    # Cropping only pays off when the text occupies a minority of the frame.
+    if not regions or covered > small_w * small_h * ROI_MAX_COVERAGE:
+        return []
+    regions.sort(key=lambda box: (box[1], box[0]))
+    return regions
+
+def preprocess_regions(pil_image, mode="product", detect_regions=True):
+    # Denoises only the detected text regions; falls back to the whole image
+    # when detection is off or finds no regions. Returns (images, cropped).
+    gray = _to_gray(pil_image)
+    regions = find_text_regions(gray) if detect_regions else []
+    if not regions:
+        return [_preprocess_gray(gray, mode)], False
+    crops = [_preprocess_gray(gray[y:y + h, x:x + w].copy(), mode, MIN_CROP_HEIGHT) for x, y, w, h in regions]
+    return crops, True
+
+def limit_tesseract_threads():
+    # Each tesseract run would otherwise start its own OpenMP threads and
+    # oversubscribe the cores while OCR jobs run side by side. The entry
+    # points (app, ingest_cli, ingest_service) call this at startup rather
+    # than on import, because OMP_THREAD_LIMIT applies to every OpenMP user
+    # in the process and its children, not only tesseract. A value already
+    # set in the environment is kept.
+    os.environ.setdefault("OMP_THREAD_LIMIT", TESSERACT_OMP_THREADS)
+
+def _get_ocr_executor():
+    global _ocr_executor
+    with _ocr_executor_lock:
+        if _ocr_executor is None:
+            default = min(len(OCR_CONFIGS), os.cpu_count() or 1)
+            workers = max(1, int(os.environ.get("OCR_THREADS", default)))
+            _ocr_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr")
+        return _ocr_executor
+
+def _data_to_text(data):
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        word = word.strip()
+        if not word:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+        conf = float(data["conf"][i])
+        if conf >= 0:
+            confidences.append(conf)
+
+    text_lines = []
+    previous_block = None
+    for key in sorted(lines):
+        if previous_block is not None and key[0] != previous_block:
+            text_lines.append("")
+        text_lines.append(" ".join(lines[key]))
+        previous_block = key[0]
+
+    mean_conf = sum(confidences) / len(confidences) if confidences else 0.0
+    return "\n".join(text_lines), mean_conf
+
+class OCRError(Exception):
+    pass
+
+def _run_config(pil_image, config):
+    with span("ocr_config", config=config, engine="pytesseract"):
+        data = pytesseract.image_to_data(
+            pil_image, config=config, output_type=pytesseract.Output.DICT
+        )
+    return _data_to_text(data)
+
+def _submit_config(pil_image, config, pool):
+    if pool is not None:
         try:
-            text = pytesseract.image_to_string(pil_image, config=config)
-            if text.strip():
-                results.append(text.strip())
-        except:
+            return pool.submit(pil_image, config)
+        except (queue.Full, RuntimeError):
+            pass
+    return _get_ocr_executor().submit(_run_config, pil_image, config)
+
+def _run_configs(pil_images, configs, pool, best):
+    # Submits every image x config job at once and keeps, per image, the
+    # result with the highest mean word confidence in best. A failed config
+    # is skipped; OCRError is raised only when every job failed, so a
+    # missing or crashing tesseract is not mistaken for a blank label.
+    owners = {}
+    for index, pil_image in enumerate(pil_images):
+        for config in configs:
+            owners[_submit_config(pil_image, config, pool)] = index
+    errors = []
+    for future in as_completed(owners):
+        index = owners[future]
+        try:
+            text, conf = future.result()
+        except Exception as e:
+            errors.append(e)
             continue
-    return max(results, key=len) if results else ""
-
-def parse_expiry_date(text):
-    patterns = [
-        r'(\d{2})\.(\d{4})',
-        r'(\d{2})/(\d{4})',
-        r'EXP[:\s]*([A-Z]{3,9})[-\s\.]*(\d{4})',
-        r'EXP[:\s]*(\d{2}[-/\.]\d{2}[-/\.]\d{4})',
-        r'BEST\s*BEFORE[:\s]*([A-Z]{3,9})[-\s\.]*(\d{4})',
-        r'USE\s*BY[:\s]*([A-Z]{3,9})[-\s\.]*(\d{4})',
-        r'HALTBAR\s*BIS[:\s]*(\d{2}[-/\.]\d{4})',
-        r'MHD[:\s]*(\d{2}[-/\.]\d{4})',
-        r'\b([A-Z]{3,9})[-\s\.]+(\d{4})\b',
-    ]
-    
-    month_map = {
-        'JAN': 1, 'JANUARY': 1, 'FEB': 2, 'FEBRUARY': 2,
-        'MAR': 3, 'MARCH': 3, 'APR': 4, 'APRIL': 4, 'MAY': 5,
-        'JUN': 6, 'JUNE': 6, 'JUL': 7, 'JULY': 7,
-        'AUG': 8, 'AUGUST': 8, 'SEP': 9, 'SEPT': 9, 'SEPTEMBER': 9,
-        'OCT': 10, 'OCTOBER': 10, 'NOV': 11, 'NOVEMBER': 11,
-        'DEC': 12, 'DECEMBER': 12
-    }
-    
-    text_upper = text.upper()
-    
-    for pattern in patterns:
-        match = re.search(pattern, text_upper)
-        if match:
-            try:
-                groups = match.groups()
-                
-                if len(groups) == 2 and groups[0].isdigit() and len(groups[0]) == 2:
-                    month = int(groups[0])
-                    year = int(groups[1])
-                    if 1 <= month <= 12:
-                        last_day = calendar.monthrange(year, month)[1]
-                        return f"{last_day:02d}-{month:02d}-{year}"
-                
-                if len(groups) == 2 and groups[0] in month_map:
-                    month = month_map[groups[0]]
-                    year = int(groups[1])
-                    last_day = calendar.monthrange(year, month)[1]
-                    return f"{last_day:02d}-{month:02d}-{year}"
-                
-                if len(groups) == 1 and '-' in groups[0]:
-                    date_str = groups[0].replace(' ', '-').replace('.', '-').replace('/', '-')
-                    parts = date_str.split('-')
-                    
-                    if len(parts) == 2:
-                        month_str, year_str = parts
-                        
-                        if month_str in month_map:
-                            month = month_map[month_str]
-                            year = int(year_str)
-                            last_day = calendar.monthrange(year, month)[1]
-                            return f"{last_day:02d}-{month:02d}-{year}"
-                        
-                        try:
-                            month = int(month_str)
-                            year = int(year_str)
-                            if 1 <= month <= 12:
-                                last_day = calendar.monthrange(year, month)[1]
-                                return f"{last_day:02d}-{month:02d}-{year}"
-                        except:
-                            pass
-            except:
-                continue
-    
-    return None
\ No newline at end of file
+        if text.strip() and conf > best[index][1]:
+            best[index] = (text.strip(), conf)
+    if errors and len(errors) == len(owners):
+        raise OCRError(f"All {len(owners)} OCR runs failed: {errors[0]}") from errors[0]
+
+def extract_texts_with_confidence(pil_images, configs=None, min_confidence=CONFIDENCE_THRESHOLD,
+                                  pool=None, use_pool=True):
+    # Reads every image with the first PSM config, then runs the remaining
+    # configs only on the images whose result is below min_confidence, so a
+    # confident first pass really saves the other tesseract runs. Within a
+    # pass all jobs are submitted at once, so the crops of one label are read
+    # side by side. Configs go to the persistent tesseract pool when
+    # available and fall back to a pytesseract subprocess when the pool
+    # queue is full.
+    configs = configs or OCR_CONFIGS
+    if pool is None and use_pool:
+        pool = get_ocr_pool()
+    best = [("", -1.0)] * len(pil_images)
+    _run_configs(pil_images, configs[:1], pool, best)
+
+    retry = [index for index, (_, conf) in enumerate(best) if conf < min_confidence]
+    if retry and len(configs) > 1:
+        retry_best = [best[index] for index in retry]
+        try:
+            _run_configs([pil_images[index] for index in retry], configs[1:], pool, retry_best)
+        except OCRError:
+            # The first pass did read these images; keep its results.
+            pass
+        for index, result in zip(retry, retry_best):
+            best[index] = result
+
+    return [(text, max(conf, 0.0)) for text, conf in best]
+
+def extract_text_with_confidence(pil_image, configs=None, min_confidence=CONFIDENCE_THRESHOLD,
+                                 pool=None, use_pool=True):
+    return extract_texts_with_confidence([pil_image], configs, min_confidence, pool, use_pool)[0]
+
+@traced()
+def extract_text_multiconfig(pil_image, pool=None, use_pool=True):
+    return extract_text_with_confidence(pil_image, pool=pool, use_pool=use_pool)[0]
+
+@traced("extract_text_multiconfig")
+def extract_texts_multiconfig(pil_images, pool=None, use_pool=True):
+    results = extract_texts_with_confidence(pil_images, pool=pool, use_pool=use_pool)
+    return [text for text, _ in results]
+
+def ocr_image(pil_image, mode="product", detect_regions=True, timings=None, use_cache=False):
+    # Preprocess + OCR in one call. With detect_regions the expensive
+    # filters and Tesseract only see the cropped text blocks; the full
+    # frame is used when no regions are found or they yield no text.
+    # use_cache looks the image up in the OCR cache first (perceptual hash
+    # for product labels, exact pixels for expiry labels).
+    if use_cache:
+        cache = get_ocr_cache()
+        image_hash, detail = cache.key(pil_image, mode)
+        text = cache.get(image_hash, mode, detail)
+        if text is None:
+            text = ocr_image(pil_image, mode, detect_regions, timings)
+            # No text may be a bad photo rather than a blank label; the next
+            # upload gets a fresh read.
+            if text:
+                cache.set(image_hash, mode, text, detail)
+        return text
+
+    start = time.perf_counter()
+    crops, cropped = preprocess_regions(pil_image, mode, detect_regions)
+    _add_timing(timings, "preprocess", start)
+
+    start = time.perf_counter()
+    text = "\n".join(t for t in extract_texts_multiconfig(crops) if t)
+    _add_timing(timings, "ocr", start)
+
+    if not text and cropped:
+        return ocr_image(pil_image, mode, detect_regions=False, timings=timings)
+    return text
+
+def _add_timing(timings, stage, start):
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
@@ -0,0 +1,245 @@
+import time
+from calendar import monthrange
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from barcode_catalogue import decode_barcodes, get_barcode_catalogue
+from expiry_parser import parse_expiry_date
+from llm_utils import ask_llm_many, safe_json_parse
+from metrics import span
+from ocr_utils import ocr_image
+from product_classifier import CONFIDENCE_THRESHOLD, get_classifier
+
+# Constrained output for the extraction prompts: the schema keeps the model
+# from wrapping the JSON in prose, and num_predict caps the answer at a few
+# dozen tokens instead of letting it ramble for hundreds.
+PRODUCT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "category": {"type": "string"},
+        "quantity": {"type": "string"}
+    },
+    "required": ["name", "category", "quantity"]
+}
+EXPIRY_SCHEMA = {
+    "type": "object",
+    "properties": {"expiry": {"type": "string"}},
+    "required": ["expiry"]
+}
+PRODUCT_MAX_TOKENS = 64
+EXPIRY_MAX_TOKENS = 32
+
+# The fixed instructions go in the system prompt and only the OCR text in
+# the prompt, so Ollama evaluates the instructions once and reuses them for
+# every label (see llm_utils.warm_up).
+PRODUCT_SYSTEM = """IMPORTANT: This is a NEW product analysis. Forget any previous products.
+
+I will show you OCR text from a product label. The text may be in GERMAN or English.
+
+CRITICAL: If you see German words, translate them:
+- REIS = Rice
+- BASMATI-REIS or BASMATI REIS = Basmati Rice
+- KAFFEE = Coffee
+- MILCH = Milk
+- ZUCKER = Sugar
+
+Product Type Keywords:
+- Rice: RICE, REIS, BASMATI, JASMINE, BASMATI-REIS
+- Coffee: COFFEE, KAFFEE, ESPRESSO
+- Tea: TEA, TEE, CHAI
+- Spice: MASALA, CURRY, GEWÜRZ
+- Dairy: MILK, MILCH, YOGURT, KÄSE
+
+Task:
+1. Look at the OCR text - do you see "BASMATI" or "REIS"?
+2. If YES → name="Basmati Reis", category="Rice/Grains"
+3. Find quantity like "1kg", "500g", "1 kg", "500 g"
+
+Examples:
+- OCR has "aromatischer BASMATI-REIS 1kg" → name="Basmati Reis", category="Rice/Grains", quantity="1kg"
+- OCR has "MACCOFFEE 100g" → name="MacCoffee", category="Coffee", quantity="100g"
+
+Return ONLY JSON:
+{
+  "name": "product name",
+  "category": "category",
+  "quantity": "amount or Unknown"
+}"""
+
+EXPIRY_SYSTEM = """Extract expiry date from OCR text.
+
+Patterns to look for:
+- 02.2027 → February 2027
+- EXP: OCT-2025 → October 2025
+- MHD: 05.2026 → May 2026
+- DEC 2027 → December 2027
+
+IMPORTANT: If only month and year are given (e.g., "OCT 2025"), use the LAST day of that month.
+
+Examples:
+- OCT 2025 → 2025-10-31 (October has 31 days)
+- FEB 2026 → 2026-02-28 (February has 28 days in non-leap year)
+- APR 2027 → 2027-04-30 (April has 30 days)
+
+Return ONLY valid JSON:
+{
+  "expiry": "DD-MM-YYYY"
+}"""
+
+WARMUP_SYSTEM_PROMPTS = (PRODUCT_SYSTEM, EXPIRY_SYSTEM)
+
+def build_product_prompt(text):
+    return f"""OCR Text from Product Label:
+'''
+{text}
+'''
+
+JSON:"""
+
+def build_expiry_prompt(text):
+    return f"""OCR Text:
+{text}
+
+JSON:"""
+
+def normalize_llm_expiry(raw_expiry):
+    if not raw_expiry or raw_expiry == "Unknown":
+        return "Unknown"
+    try:
+        exp_dt = datetime.strptime(raw_expiry, "%d-%m-%Y")
+    except:
+        return raw_expiry
+    # The model tends to answer month/year labels with the 1st of the month.
+    if exp_dt.day == 1:
+        last_day = monthrange(exp_dt.year, exp_dt.month)[1]
+        return f"{last_day:02d}-{exp_dt.month:02d}-{exp_dt.year}"
+    return raw_expiry
+
+@contextmanager
+def timed(timings, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+def classify_product(product_text, product_data=None, timings=None):
+    # (details, source). product_data, when given (e.g. from the barcode
+    # catalogue), is used as is; otherwise the local classifier is tried.
+    # details is None when the label still needs the LLM.
+    if product_data is not None:
+        return product_data, "barcode"
+    with timed(timings, "parse"):
+        classifier = get_classifier()
+        product_data = classifier.classify(product_text)
+        resolved_locally = product_data["confidence"] >= CONFIDENCE_THRESHOLD
+        classifier.record(resolved_locally)
+    return (product_data, "local") if resolved_locally else (None, "llm")
+
+def ask_product(product_text, use_cache=True, timings=None):
+    with timed(timings, "llm"):
+        response = ask_llm_many([{
+            "prompt": build_product_prompt(product_text),
+            "system": PRODUCT_SYSTEM,
+            "format": PRODUCT_SCHEMA,
+            "num_predict": PRODUCT_MAX_TOKENS
+        }], use_cache=use_cache)[0]
+    return safe_json_parse(response)
+
+def ask_expiry(expiry_text, use_cache=True, timings=None):
+    with timed(timings, "llm"):
+        response = ask_llm_many([{
+            "prompt": build_expiry_prompt(expiry_text),
+            "system": EXPIRY_SYSTEM,
+            "format": EXPIRY_SCHEMA,
+            "num_predict": EXPIRY_MAX_TOKENS
+        }], use_cache=use_cache)[0]
+    return normalize_llm_expiry(safe_json_parse(response).get("expiry", "Unknown"))
+
+def complete_details(read_product, read_expiry, use_cache=True, timings=None):
+    # read_product() and read_expiry() return what read_product_label and
+    # read_expiry_label do, read here or waited for when prefetched. A
+    # product prompt starts as soon as the product read is in, so it runs
+    # while the expiry label is still being read and, if its date could not
+    # be parsed locally, alongside the expiry prompt.
+    barcode, product_data, product_text = read_product()
+    product_data, source = classify_product(product_text, product_data, timings)
+
+    product_timings = {}
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="product-llm") as executor:
+        product_ask = None
+        if product_data is None:
+            product_ask = executor.submit(ask_product, product_text, use_cache, product_timings)
+
+        expiry_text, expiry_date = read_expiry()
+        if not expiry_date:
+            expiry_date = ask_expiry(expiry_text, use_cache, timings)
+        if product_ask is not None:
+            product_data = product_ask.result()
+    if timings is not None:
+        for stage, seconds in product_timings.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    return {
+        "name": product_data.get("name", "Unknown Product"),
+        "category": product_data.get("category", "Unknown Category"),
+        "quantity": product_data.get("quantity", "Unknown"),
+        "expiry": expiry_date if expiry_date else "Unknown",
+        "source": source,
+        "barcode": barcode,
+        "product_text": product_text,
+        "expiry_text": expiry_text
+    }
+
+def lookup_barcode(product_image, timings=None):
+    # (first decoded code or None, catalogue details or None).
+    with timed(timings, "barcode"):
+        codes = decode_barcodes(product_image)
+        code, product_data = get_barcode_catalogue().find(codes)
+    return code or (codes[0] if codes else None), product_data
+
+def process_image_pair(product_image, expiry_image, use_cache=True, timings=None):
+    return process_candidates([product_image], [expiry_image], use_cache, timings)
+
+def read_product_label(product_images, use_cache=True, timings=None):
+    # (barcode, catalogue details or None, OCR text). A product whose
+    # barcode is in the catalogue skips product OCR and, later, the product
+    # LLM call entirely.
+    barcode, product_data = None, None
+    for image in product_images:
+        barcode, product_data = lookup_barcode(image, timings)
+        if barcode:
+            break
+
+    product_text = ""
+    if product_data is None:
+        for image in product_images:
+            product_text = ocr_image(image, mode="product", timings=timings, use_cache=use_cache)
+            if product_text:
+                break
+    return barcode, product_data, product_text
+
+def read_expiry_label(expiry_images, use_cache=True, timings=None):
+    # (OCR text, locally parsed date or None).
+    expiry_text = ""
+    for image in expiry_images:
+        text = ocr_image(image, mode="expiry", timings=timings, use_cache=use_cache)
+        with timed(timings, "parse"), span("parse_expiry_date"):
+            expiry_date = parse_expiry_date(text)
+        if expiry_date:
+            return text, expiry_date
+        expiry_text = expiry_text or text
+    return expiry_text, None
+
+def process_candidates(product_images, expiry_images, use_cache=True, timings=None):
+    # Each list holds candidate frames of one label, best first (see
+    # frame_selection). Later candidates are only OCR'd when the earlier
+    # ones give no text (product) or no date the local parser can read
+    # (expiry), so the LLM sees a single attempt.
+    return complete_details(
+        lambda: read_product_label(product_images, use_cache, timings),
+        lambda: read_expiry_label(expiry_images, use_cache, timings),
+        use_cache=use_cache, timings=timings
+    )
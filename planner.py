@@ -0,0 +1,177 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from expiry_index import days_until, expiry_ordinal
+from inventory_model import parse_quantity
+from llm_utils import ask_llm_many, safe_json_parse
+
+# Rough prompt budget per request, in tokens (about 4 characters each),
+# including room for the answer.
+CONTEXT_BUDGET_TOKENS = 2048
+RESPONSE_TOKENS_PER_ITEM = 150
+# Generation cap for the JSON answer: a little slack on top of the
+# per-item estimate.
+RESPONSE_TOKENS_SLACK = 64
+# Share of the budget for the "other products" line; it is part of every
+# prompt, so a large pantry is summarised rather than listed in full.
+OTHER_PRODUCTS_BUDGET_TOKENS = 256
+# Items expiring further out than this are left out of the plan.
+PLANNING_HORIZON_DAYS = 14
+MAX_CACHED_PLANS = 16
+
+_plan_cache = OrderedDict()
+_plan_cache_lock = threading.Lock()
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def rank_items(inventory, now=None, horizon_days=PLANNING_HORIZON_DAYS):
+    # Items worth planning, most urgent first: soonest expiry, then the
+    # larger remaining quantity. Expired, depleted and undated items are
+    # skipped.
+    now = now or datetime.now()
+    ranked = []
+    for name, details in inventory.items():
+        ordinal = expiry_ordinal(details.get("expiry"))
+        if ordinal is None:
+            continue
+        days_left = days_until(ordinal, now)
+        quantity, _ = parse_quantity(details.get("quantity"))
+        if days_left < 0 or days_left > horizon_days or quantity == 0:
+            continue
+        ranked.append((days_left, -(quantity or 0), name, details))
+    ranked.sort(key=lambda entry: entry[:3])
+    return [(name, details, days_left) for days_left, _, name, details in ranked]
+
+def summarize_others(inventory, planned, budget_tokens=OTHER_PRODUCTS_BUDGET_TOKENS):
+    # The products not being planned, grouped by category, in at most
+    # budget_tokens. The ones expiring soonest are named first; whatever
+    # does not fit is only counted.
+    others = [(expiry_ordinal(details.get("expiry")), name, details.get("category") or "Other")
+              for name, details in inventory.items() if name not in planned]
+    if not others:
+        return "No other products"
+    others.sort(key=lambda entry: (entry[0] is None, entry[0] or 0, entry[1]))
+
+    by_category = {}
+    used = 0
+    for _, name, category in others:
+        cost = estimate_tokens(name) + (0 if category in by_category else estimate_tokens(category))
+        if used + cost > budget_tokens:
+            break
+        by_category.setdefault(category, []).append(name)
+        used += cost
+    listed = sum(len(names) for names in by_category.values())
+    if not listed:
+        return f"{len(others)} other products"
+    summary = "; ".join(f"{category}: {', '.join(names)}" for category, names in by_category.items())
+    if listed < len(others):
+        summary += f" (and {len(others) - listed} more)"
+    return summary
+
+def _item_line(name, details, days_left):
+    return (f"- {name} | {details.get('category', 'Unknown')} | qty {details.get('quantity', 'Unknown')}"
+            f" | expires {details.get('expiry')} ({days_left} days left)")
+
+def _prompt_header(other_products, equipment, skill, now):
+    return f"""You are a meal planner helping a household use up groceries before they expire.
+
+Current Date: {now.strftime('%Y-%m-%d')}
+Equipment: {equipment}
+Cooking skill level: {skill}
+Other products available: {other_products}
+
+For EACH item below, suggest 2-3 dated meals that use it before it expires.
+Prefer combining items from this list with each other and with the other products.
+
+Items (name | category | quantity | expiry):
+"""
+
+_PROMPT_FOOTER = """
+Return ONLY valid JSON:
+{
+  "plans": [
+    {
+      "product": "exact item name from the list",
+      "meals": [
+        {"date": "YYYY-MM-DD", "meal": "dish name", "combine_with": ["other items"], "method": "brief prep note"}
+      ]
+    }
+  ]
+}
+
+JSON:"""
+
+def pack_prompts(ranked, other_products, equipment, skill, now=None, budget_tokens=CONTEXT_BUDGET_TOKENS):
+    # Packs the ranked items into as few prompts as fit the budget, keeping
+    # the most urgent items together in the first prompt.
+    now = now or datetime.now()
+    header = _prompt_header(other_products, equipment, skill, now)
+    fixed = estimate_tokens(header) + estimate_tokens(_PROMPT_FOOTER)
+
+    batches = []
+    lines, used = [], fixed
+    for name, details, days_left in ranked:
+        line = _item_line(name, details, days_left)
+        cost = estimate_tokens(line) + RESPONSE_TOKENS_PER_ITEM
+        if lines and used + cost > budget_tokens:
+            batches.append(lines)
+            lines, used = [], fixed
+        lines.append(line)
+        used += cost
+    if lines:
+        batches.append(lines)
+    return [header + "\n".join(batch) + "\n" + _PROMPT_FOOTER for batch in batches]
+
+def parse_plans(response):
+    data = safe_json_parse(response)
+    plans = {}
+    for entry in data.get("plans", []) if isinstance(data, dict) else []:
+        if isinstance(entry, dict) and entry.get("product"):
+            plans[entry["product"]] = entry.get("meals", [])
+    return plans
+
+def _request(prompt):
+    items = sum(1 for line in prompt.splitlines() if line.startswith("- "))
+    return {
+        "prompt": prompt,
+        "format": "json",
+        "num_predict": items * RESPONSE_TOKENS_PER_ITEM + RESPONSE_TOKENS_SLACK
+    }
+
+def _cache_key(inventory, equipment, skill, now, budget_tokens):
+    payload = json.dumps(
+        [inventory, equipment, skill, now.strftime('%Y-%m-%d'), budget_tokens],
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def plan_inventory(inventory, equipment, skill, now=None, budget_tokens=CONTEXT_BUDGET_TOKENS):
+    # Returns [(name, days_left, meals)] for the urgent items, most urgent
+    # first. Results are cached until the inventory (or the day) changes.
+    now = now or datetime.now()
+    key = _cache_key(inventory, equipment, skill, now, budget_tokens)
+    with _plan_cache_lock:
+        if key in _plan_cache:
+            _plan_cache.move_to_end(key)
+            return _plan_cache[key]
+
+    ranked = rank_items(inventory, now)
+    planned = {name for name, _, _ in ranked}
+    other_products = summarize_others(inventory, planned, min(OTHER_PRODUCTS_BUDGET_TOKENS, budget_tokens // 4))
+
+    prompts = pack_prompts(ranked, other_products, equipment, skill, now, budget_tokens)
+    plans = {}
+    for response in ask_llm_many([_request(prompt) for prompt in prompts]):
+        plans.update(parse_plans(response))
+
+    result = [(name, days_left, plans.get(name, [])) for name, _, days_left in ranked]
+    # Only cache complete answers so a failed request is retried next time.
+    if all(meals for _, _, meals in result):
+        with _plan_cache_lock:
+            _plan_cache[key] = result
+            while len(_plan_cache) > MAX_CACHED_PLANS:
+                _plan_cache.popitem(last=False)
+    return result
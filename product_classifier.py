@@ -0,0 +1,187 @@
+import json
+import os
+import re
+import tempfile
+import threading
+from metrics import increment
+
+PRODUCT_DICTIONARY_FILE = os.path.join(".cache", "product_dictionary.json")
+# Minimum confidence for a local result to be used without asking the LLM.
+CONFIDENCE_THRESHOLD = 0.75
+# Learned names shorter than this many tokens are not used as product
+# phrases: a saved "Reis" would otherwise claim "REIS-Waffeln" labels.
+MIN_LEARNED_TOKENS = 2
+
+# Phrases that identify a specific product: token tuple -> (name, category)
+KNOWN_PRODUCTS = {
+    ("BASMATI", "REIS"): ("Basmati Reis", "Rice/Grains"),
+    ("BASMATI", "RICE"): ("Basmati Rice", "Rice/Grains"),
+    ("BASMATI",): ("Basmati Reis", "Rice/Grains"),
+    ("JASMINE", "RICE"): ("Jasmine Rice", "Rice/Grains"),
+    ("JASMIN", "REIS"): ("Jasmin Reis", "Rice/Grains"),
+    ("MACCOFFEE",): ("MacCoffee", "Coffee"),
+    ("GARAM", "MASALA"): ("Garam Masala", "Spice Mix"),
+    ("CHAI", "MASALA"): ("Chai Masala", "Spice Mix"),
+}
+
+# Keywords that only identify the category, in English and German.
+CATEGORY_KEYWORDS = {
+    "Rice/Grains": ["RICE", "REIS", "JASMINE", "JASMIN", "QUINOA", "COUSCOUS", "BULGUR", "HAFER", "OATS"],
+    "Coffee": ["COFFEE", "KAFFEE", "ESPRESSO", "CAPPUCCINO"],
+    "Tea": ["TEA", "TEE", "CHAI", "GRÜNTEE", "SCHWARZTEE"],
+    "Spice Mix": ["MASALA", "CURRY", "GEWÜRZ", "GEWÜRZMISCHUNG", "SPICE", "SPICES"],
+    "Dairy": ["MILK", "MILCH", "YOGURT", "JOGHURT", "KÄSE", "CHEESE", "BUTTER", "SAHNE", "QUARK"],
+    "Sugar": ["SUGAR", "ZUCKER"],
+    "Oil": ["OIL", "ÖL", "OLIVENÖL", "SONNENBLUMENÖL"],
+    "Pasta": ["PASTA", "NUDELN", "SPAGHETTI", "PENNE", "FUSILLI", "MACARONI"],
+    "Sauce": ["SAUCE", "SOSSE", "SOßE", "KETCHUP", "PESTO"],
+    "Canned Goods": ["DOSE", "CANNED", "KONSERVE"],
+    "Snacks": ["CHIPS", "KEKSE", "COOKIES", "CRACKER", "SCHOKOLADE", "CHOCOLATE"],
+}
+
+_TOKEN = re.compile(r"[A-ZÄÖÜß0-9]+")
+_QUANTITY = re.compile(r"(?<![\d.,])(\d+(?:[.,]\d+)?)\s*(KG|GR|G|MG|LTR|L|ML|CL)\b")
+_UNITS = {"KG": "kg", "GR": "g", "G": "g", "MG": "mg", "LTR": "l", "L": "l", "ML": "ml", "CL": "cl"}
+
+
+def tokenize(text):
+    tokens = []
+    for token in _TOKEN.findall(text.upper()):
+        # OCR often reads the letter O as a zero inside words.
+        if not token.isdigit() and any(c.isalpha() for c in token):
+            token = token.replace("0", "O")
+        tokens.append(token)
+    return tokens
+
+def extract_quantity(text):
+    match = _QUANTITY.search(text.upper())
+    if not match:
+        return None
+    return f"{match.group(1).replace(',', '.')}{_UNITS[match.group(2)]}"
+
+
+class KeywordTrie:
+    # Token-level trie: each path is a keyword phrase ("BASMATI" -> "REIS"),
+    # so multi-word and hyphenated phrases match in one left-to-right pass.
+
+    def __init__(self):
+        self._root = {}
+
+    def add(self, tokens, value):
+        node = self._root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node[None] = value
+
+    def find_all(self, tokens):
+        # Longest match starting at every position: [(length, value), ...]
+        matches = []
+        for start in range(len(tokens)):
+            node = self._root
+            best = None
+            for i in range(start, len(tokens)):
+                node = node.get(tokens[i])
+                if node is None:
+                    break
+                if None in node:
+                    best = (i - start + 1, node[None])
+            if best:
+                matches.append(best)
+        return matches
+
+
+class ProductClassifier:
+    # Resolves name, category and quantity from label OCR text with the
+    # dictionaries above plus names learned from saved products. Results
+    # below CONFIDENCE_THRESHOLD should go to the LLM instead.
+
+    def __init__(self, path=PRODUCT_DICTIONARY_FILE):
+        self.path = path
+        self.local_hits = 0
+        self.llm_fallbacks = 0
+        self._learned = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._learned = json.load(f)
+            except Exception:
+                self._learned = {}
+        self._build()
+
+    def _build(self):
+        self._products = KeywordTrie()
+        self._categories = KeywordTrie()
+        for tokens, entry in KNOWN_PRODUCTS.items():
+            self._products.add(tokens, entry)
+        for name, category in self._learned.items():
+            tokens = tokenize(name)
+            if len(tokens) >= MIN_LEARNED_TOKENS:
+                self._products.add(tokens, (name, category))
+        for category, keywords in CATEGORY_KEYWORDS.items():
+            for keyword in keywords:
+                self._categories.add(tokenize(keyword), category)
+
+    def classify(self, text):
+        tokens = tokenize(text)
+        quantity = extract_quantity(text) or "Unknown"
+
+        products = self._products.find_all(tokens)
+        if products:
+            names = {value for _, value in products}
+            _, (name, category) = max(products, key=lambda match: match[0])
+            # Two different products on one label is ambiguous, however long
+            # the matched phrases are.
+            confidence = 0.95 if len(names) == 1 else 0.5
+            return {"name": name, "category": category, "quantity": quantity, "confidence": confidence}
+
+        categories = {value for _, value in self._categories.find_all(tokens)}
+        if len(categories) == 1:
+            # The category is clear but not the product name.
+            return {"name": "Unknown Product", "category": categories.pop(),
+                    "quantity": quantity, "confidence": 0.5}
+        return {"name": "Unknown Product", "category": "Unknown Category",
+                "quantity": quantity, "confidence": 0.0}
+
+    def record(self, used_local):
+        with self._lock:
+            if used_local:
+                self.local_hits += 1
+            else:
+                self.llm_fallbacks += 1
+        increment("product_classifier_total", labels={"result": "local" if used_local else "llm"})
+
+    def learn(self, name, category):
+        # Remembers a confirmed product so its name on a label resolves
+        # locally next time. Single-word names are too generic to trust.
+        if not name or len(tokenize(name)) < MIN_LEARNED_TOKENS or name in self._learned:
+            return
+        with self._lock:
+            self._learned[name] = category
+            self._build()
+            if self.path:
+                directory = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(self._learned, f, indent=2, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+
+    def stats(self):
+        total = self.local_hits + self.llm_fallbacks
+        return {
+            "local_hits": self.local_hits,
+            "llm_fallbacks": self.llm_fallbacks,
+            "hit_rate": self.local_hits / total if total else 0.0,
+        }
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+def get_classifier():
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = ProductClassifier()
+        return _classifier
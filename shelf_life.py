@@ -0,0 +1,193 @@
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from llm_utils import ask_llm, safe_json_parse
+
+SHELF_LIFE_FILE = os.path.join(".cache", "shelf_life.json")
+DEFAULT_DAYS = 7
+DEFAULT_TIP = "Store in cool, dry place"
+# The answer is a two-field JSON object; cap generation accordingly.
+SHELF_LIFE_MAX_TOKENS = 64
+
+# Conservative (minimum) shelf life in days, from the guidelines the LLM
+# prompt has always carried: leafy greens 3-5, root vegetables 7-21,
+# tomatoes 5-7, fruits 5-10, berries 3-5, herbs 5-7.
+SHELF_LIFE_TABLE = {
+    "lettuce": (3, "Refrigerate in a bag with a paper towel to absorb moisture"),
+    "spinach": (3, "Refrigerate unwashed in a loosely closed bag"),
+    "kale": (3, "Refrigerate unwashed in a loosely closed bag"),
+    "rocket": (3, "Refrigerate in a bag with a paper towel to absorb moisture"),
+    "onion": (7, "Keep in a cool, dark, ventilated place away from potatoes"),
+    "potato": (7, "Keep in a cool, dark place; do not refrigerate"),
+    "carrot": (7, "Refrigerate with the tops removed"),
+    "beetroot": (7, "Refrigerate with the leaves removed"),
+    "tomato": (5, "Keep at room temperature until ripe, then refrigerate"),
+    "apple": (5, "Refrigerate away from other produce"),
+    "orange": (5, "Keep in a cool place or refrigerate"),
+    "strawberry": (3, "Refrigerate unwashed; wash just before eating"),
+    "blueberry": (3, "Refrigerate unwashed; wash just before eating"),
+    "raspberry": (3, "Refrigerate unwashed; wash just before eating"),
+    "basil": (5, "Keep stems in water at room temperature"),
+    "parsley": (5, "Refrigerate with stems in water, loosely covered"),
+    "coriander": (5, "Refrigerate with stems in water, loosely covered"),
+    "mint": (5, "Refrigerate wrapped in a damp paper towel"),
+}
+
+# Alternative and German names mapped onto SHELF_LIFE_TABLE keys.
+ALIASES = {
+    "salad": "lettuce", "salat": "lettuce", "spinat": "spinach", "grünkohl": "kale",
+    "rucola": "rocket", "arugula": "rocket",
+    "zwiebel": "onion", "kartoffel": "potato", "karotte": "carrot", "möhre": "carrot",
+    "rote bete": "beetroot", "beet": "beetroot",
+    "tomate": "tomato", "apfel": "apple", "äpfel": "apple",
+    "erdbeere": "strawberry", "heidelbeere": "blueberry", "himbeere": "raspberry",
+    "basilikum": "basil", "petersilie": "parsley", "cilantro": "coriander",
+    "koriander": "coriander", "minze": "mint",
+}
+
+# Fallback by the produce form's category when the item is unknown and the
+# LLM is unavailable.
+CATEGORY_DEFAULTS = {
+    "Leafy Greens": (3, "Refrigerate in a bag with a paper towel to absorb moisture"),
+    "Herbs": (5, "Refrigerate with stems in water, loosely covered"),
+}
+
+def _candidates(name):
+    # The name itself, then plausible singular forms (English and German).
+    yield name
+    if name.endswith("ies"):
+        yield name[:-3] + "y"
+    if name.endswith("es"):
+        yield name[:-2]
+    if name.endswith("s") and not name.endswith("ss"):
+        yield name[:-1]
+    if name.endswith("en"):
+        yield name[:-2]
+        yield name[:-1]
+    if name.endswith("n"):
+        yield name[:-1]
+
+def normalize_name(name):
+    name = " ".join(name.lower().split())
+    for candidate in _candidates(name):
+        if candidate in SHELF_LIFE_TABLE:
+            return candidate
+        if candidate in ALIASES:
+            return ALIASES[candidate]
+    # Unknown items are memoised under a simple English singular.
+    if name.endswith("ies"):
+        return name[:-3] + "y"
+    if name.endswith("oes"):
+        return name[:-2]
+    if name.endswith("s") and not name.endswith("ss"):
+        return name[:-1]
+    return name
+
+SHELF_LIFE_SYSTEM = """Estimate the typical shelf life for the fresh produce item given below when stored properly.
+
+Provide a CONSERVATIVE estimate (minimum days before spoiling when refrigerated if needed).
+
+Common guidelines:
+- Leafy Greens: 3-5 days
+- Root Vegetables (onions, potatoes, carrots): 7-21 days
+- Tomatoes: 5-7 days
+- Fruits (apples, oranges): 5-10 days
+- Berries: 3-5 days
+- Herbs: 5-7 days
+
+Return ONLY valid JSON:
+{
+  "days": number,
+  "storage_tip": "brief storage advice"
+}"""
+
+def build_shelf_life_prompt(name, category, quantity):
+    return f"""Product: {name}
+Category: {category}
+Quantity: {quantity}
+
+JSON:"""
+
+
+class ShelfLifeTable:
+    # Answers from the built-in table first, then from LLM answers memoised
+    # per normalised (name, category), and only asks the LLM for items it
+    # has never seen.
+
+    def __init__(self, path=SHELF_LIFE_FILE):
+        self.path = path
+        self._learned = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._learned = json.load(f)
+            except Exception:
+                self._learned = {}
+
+    def _key(self, name, category):
+        return f"{normalize_name(name)}|{category}"
+
+    def lookup(self, name, category):
+        key = normalize_name(name)
+        if key in SHELF_LIFE_TABLE:
+            days, tip = SHELF_LIFE_TABLE[key]
+            return {"days": days, "storage_tip": tip, "source": "table"}
+        learned = self._learned.get(self._key(name, category))
+        if learned:
+            return {"days": learned["days"], "storage_tip": learned["storage_tip"], "source": "memo"}
+        return None
+
+    def remember(self, name, category, days, storage_tip):
+        with self._lock:
+            self._learned[self._key(name, category)] = {"days": days, "storage_tip": storage_tip}
+            if not self.path:
+                return
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._learned, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def estimate(self, name, category, quantity=1):
+        result = self.lookup(name, category)
+        if result:
+            return result
+
+        response = ask_llm(build_shelf_life_prompt(name, category, quantity), use_cache=True,
+                           format="json", num_predict=SHELF_LIFE_MAX_TOKENS,
+                           system=SHELF_LIFE_SYSTEM)
+        data = safe_json_parse(response)
+        try:
+            days = int(data["days"])
+        except (KeyError, TypeError, ValueError):
+            days = None
+        if days is not None and days > 0:
+            storage_tip = data.get("storage_tip") or DEFAULT_TIP
+            self.remember(name, category, days, storage_tip)
+            return {"days": days, "storage_tip": storage_tip, "source": "llm"}
+
+        # LLM unavailable or unparseable: fall back without memoising.
+        days, tip = CATEGORY_DEFAULTS.get(category, (DEFAULT_DAYS, DEFAULT_TIP))
+        return {"days": days, "storage_tip": tip, "source": "default"}
+
+
+_table = None
+_table_lock = threading.Lock()
+
+def get_shelf_life_table():
+    global _table
+    with _table_lock:
+        if _table is None:
+            _table = ShelfLifeTable()
+        return _table
+
+def estimate_expiry(name, category, quantity=1, today=None):
+    # Returns the shelf-life estimate with an "expiry" date (DD-MM-YYYY).
+    result = get_shelf_life_table().estimate(name, category, quantity)
+    today = today or datetime.now()
+    result["expiry"] = (today + timedelta(days=result["days"])).strftime('%d-%m-%Y')
+    return result
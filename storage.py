@@ -1,21 +1,213 @@
 import json
+import logging
 import os
+import sqlite3
+import tempfile
+import threading
+from metrics import span, traced
 
 INVENTORY_FILE = "inventory_data.json"
+INVENTORY_DB = "inventory.db"
+# "sqlite" (default) or "json"
+STORAGE_BACKEND = os.environ.get("INVENTORY_BACKEND", "sqlite")
 
-def load_inventory():
-    if os.path.exists(INVENTORY_FILE):
+logger = logging.getLogger(__name__)
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class JSONInventoryStore:
+    # Whole-file JSON store. Writes go to a temp file that atomically
+    # replaces the original, so a crash never leaves a half-written file.
+
+    def __init__(self, path=INVENTORY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write(self, inventory):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".inventory-", suffix=".tmp")
         try:
-            with open(INVENTORY_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(inventory, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
         except:
-            return {}
-    return {}
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def upsert_many(self, items):
+        with self._lock:
+            inventory = self.load()
+            inventory.update(items)
+            self._write(inventory)
+
+    def upsert(self, name, details):
+        self.upsert_many({name: details})
+
+    def delete(self, name):
+        with self._lock:
+            inventory = self.load()
+            if inventory.pop(name, None) is not None:
+                self._write(inventory)
+
+    def replace_all(self, inventory):
+        with self._lock:
+            self._write(inventory)
+
+
+class SQLiteInventoryStore:
+    # One row per item in a WAL-mode database. Adds and deletes touch only
+    # the affected rows and every write is its own transaction, so
+    # concurrent sessions (and the bulk-ingest CLI) no longer overwrite
+    # each other's changes.
+
+    def __init__(self, path=INVENTORY_DB, migrate_from=INVENTORY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS items (name TEXT PRIMARY KEY, data TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+        if migrate_from:
+            self.migrate_from_json(migrate_from)
+
+    def migrate_from_json(self, json_path):
+        # Imports the legacy JSON inventory once. The marker row keeps a
+        # later, intentionally emptied database from being re-populated.
+        with self._lock, self._conn:
+            done = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'migrated_from_json'"
+            ).fetchone()
+            if done is not None:
+                return 0
+            inventory = {}
+            if os.path.exists(json_path):
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    inventory = json.load(f)
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO items (name, data) VALUES (?, ?)",
+                [(name, json.dumps(details, ensure_ascii=False)) for name, details in inventory.items()]
+            )
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('migrated_from_json', ?)", (json_path,)
+            )
+            return len(inventory)
+
+    def load(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT name, data FROM items ORDER BY rowid").fetchall()
+        return {name: json.loads(data) for name, data in rows}
+
+    def upsert_many(self, items):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO items (name, data) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET data = excluded.data",
+                [(name, json.dumps(details, ensure_ascii=False)) for name, details in items.items()]
+            )
+
+    def upsert(self, name, details):
+        self.upsert_many({name: details})
+
+    def delete(self, name):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM items WHERE name = ?", (name,))
+
+    def replace_all(self, inventory):
+        # Applies only the difference against the stored rows, in a single
+        # transaction.
+        with self._lock, self._conn:
+            rows = self._conn.execute("SELECT name, data FROM items").fetchall()
+            current = dict(rows)
+            changed = []
+            for name, details in inventory.items():
+                data = json.dumps(details, ensure_ascii=False)
+                if current.get(name) != data:
+                    changed.append((name, data))
+            removed = [(name,) for name in current if name not in inventory]
+            self._conn.executemany(
+                "INSERT INTO items (name, data) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET data = excluded.data",
+                changed
+            )
+            self._conn.executemany("DELETE FROM items WHERE name = ?", removed)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            if STORAGE_BACKEND == "json":
+                _store = JSONInventoryStore()
+            else:
+                _store = SQLiteInventoryStore()
+        return _store
+
+def set_store(store):
+    global _store
+    with _store_lock:
+        _store = store
+
+@traced()
+def load_inventory():
+    try:
+        return get_store().load()
+    except Exception:
+        logger.exception("Failed to load inventory")
+        return {}
 
 def save_inventory(inventory):
     try:
-        with open(INVENTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(inventory, f, indent=2, ensure_ascii=False)
+        with span("save_inventory", op="replace"):
+            get_store().replace_all(inventory)
+        return True
+    except Exception:
+        logger.exception("Failed to save inventory")
+        return False
+
+def upsert_item(name, details):
+    try:
+        with span("save_inventory", op="upsert"):
+            get_store().upsert(name, details)
+        return True
+    except Exception:
+        logger.exception("Failed to save %s", name)
+        return False
+
+def upsert_items(items):
+    try:
+        with span("save_inventory", op="upsert"):
+            get_store().upsert_many(items)
+        return True
+    except Exception:
+        logger.exception("Failed to save %d items", len(items))
+        return False
+
+def delete_item(name):
+    try:
+        with span("save_inventory", op="delete"):
+            get_store().delete(name)
         return True
-    except Exception as e:
-        return False
\ No newline at end of file
+    except Exception:
+        logger.exception("Failed to delete %s", name)
+        return False